@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""
+Dynamic micro-batching of concurrent inference requests.
+"""
+
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+class MicroBatcher:
+    """
+    Groups concurrent single-item requests into batched calls.
+    
+    A background thread waits for the first request, then keeps collecting
+    until max_batch_size items have arrived or max_wait_ms has passed, and
+    calls batch_fn(items) once. batch_fn must return one result per item,
+    in order; each caller gets its own result through a Future.
+    """
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10, name="batcher"):
+        """Initialize the batcher (the batching thread starts on first submit)."""
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {
+            "batches": 0,
+            "items": 0,
+            "errors": 0,
+            "last_batch_size": 0,
+            "last_batch_seconds": 0.0,
+            "total_batch_seconds": 0.0,
+            "batch_sizes": {}
+        }
+    
+    def submit(self, item):
+        """
+        Queue one item for the next batch.
+        
+        Args:
+            item: Input for batch_fn
+        
+        Returns:
+            Future: Resolves to the item's result
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        
+        future = Future()
+        self._queue.put((item, future))
+        return future
+    
+    def __call__(self, item):
+        """Submit an item and wait for its result."""
+        return self.submit(item).result()
+    
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or the wait expires."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                # Finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+    
+    def _run(self):
+        """Run batches until close() is called."""
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+            
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            
+            start_time = time.perf_counter()
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise ValueError(f"{self.name}: batch_fn returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start_time
+            
+            self._record(len(items), elapsed)
+            for future, result in zip(futures, results):
+                future.set_result(result)
+    
+    def _record(self, size, seconds):
+        """Update the batch metrics."""
+        with self._lock:
+            stats = self._stats
+            stats["batches"] += 1
+            stats["items"] += size
+            stats["last_batch_size"] = size
+            stats["last_batch_seconds"] = seconds
+            stats["total_batch_seconds"] += seconds
+            stats["batch_sizes"][size] = stats["batch_sizes"].get(size, 0) + 1
+    
+    def stats(self):
+        """Return batch size and latency metrics as a dictionary."""
+        with self._lock:
+            stats = dict(self._stats, batch_sizes=dict(self._stats["batch_sizes"]))
+        batches = stats["batches"]
+        stats["mean_batch_size"] = stats["items"] / batches if batches else 0.0
+        stats["mean_batch_seconds"] = stats["total_batch_seconds"] / batches if batches else 0.0
+        stats["queued"] = self._queue.qsize()
+        return stats
+    
+    def close(self):
+        """Stop the batching thread after the queued items have run."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
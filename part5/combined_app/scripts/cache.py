@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+Content-addressed cache for inference results.
+"""
+
+import os
+import json
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+
+class ResultCache:
+    """
+    Two-tier cache of inference results.
+    
+    Keys are built from a hash of the input content plus the model ID and
+    generation parameters (see key()). Recent entries live in a bounded
+    in-memory LRU; if disk_path is given, entries are also written there as
+    JSON files so they survive restarts. Values must be JSON-serializable.
+    """
+    def __init__(self, max_entries=1024, disk_path=None):
+        """Initialize the cache."""
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        
+        if disk_path:
+            os.makedirs(disk_path, exist_ok=True)
+    
+    @staticmethod
+    def key(content, model_id, **params):
+        """
+        Build a cache key.
+        
+        Args:
+            content (str or bytes): Input text or file contents
+            model_id (str): Model identifier
+            **params: Generation parameters that affect the result
+        
+        Returns:
+            str: Hex SHA-256 key
+        """
+        if isinstance(content, str):
+            content = content.encode()
+        sha256_hash = hashlib.sha256(content)
+        sha256_hash.update(json.dumps({"model": model_id, "params": params}, sort_keys=True).encode())
+        return sha256_hash.hexdigest()
+    
+    def get(self, key):
+        """Return the cached value for a key, or None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return self._entries[key]
+        
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._insert(key, value)
+        return value
+    
+    def put(self, key, value):
+        """Store a value in memory and, if enabled, on disk."""
+        with self._lock:
+            self._insert(key, value)
+        self._write_disk(key, value)
+    
+    def stats(self):
+        """Return hit/miss counters and the entry count."""
+        with self._lock:
+            stats = dict(self._counters, entries=len(self._entries), max_entries=self.max_entries)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+    
+    def _insert(self, key, value):
+        """Add an entry to the memory tier, evicting the least recently used (lock held)."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+    
+    def _disk_file(self, key):
+        """Return the disk tier path for a key."""
+        return os.path.join(self.disk_path, key[:2], key[2:] + ".json")
+    
+    def _read_disk(self, key):
+        """Read an entry from the disk tier, or return None."""
+        if not self.disk_path:
+            return None
+        try:
+            with open(self._disk_file(key), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_disk(self, key, value):
+        """Write an entry to the disk tier atomically."""
+        if not self.disk_path:
+            return
+        path = self._disk_file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
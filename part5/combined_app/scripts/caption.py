@@ -5,6 +5,7 @@ Image captioning using PyTorch with Metal acceleration.
 """
 
 import os
+import time
 import torch
 import torchvision.transforms as transforms
 from PIL import Image
@@ -26,6 +27,9 @@ class ImageCaptioner:
         self.model = torch.hub.load('saahiluppal/catr', 'v3', pretrained=True).to(self.device)
         self.model.eval()
         
+        # Seconds spent in each stage of the most recent generate_captions call
+        self.last_timings = {}
+        
         # Set up image transformation
         self.transform = transforms.Compose([
             transforms.Resize(256),
@@ -39,21 +43,65 @@ class ImageCaptioner:
     
     def generate_caption(self, image_path):
         """Generate a caption for the image."""
-        # Load and transform image
-        try:
-            image = Image.open(image_path).convert("RGB")
-        except Exception as e:
-            print(f"Error loading image: {e}")
-            return "Error loading image"
+        return self.generate_captions([image_path])[0]
+    
+    def generate_captions(self, images):
+        """
+        Generate captions for several images in one forward pass.
+        
+        Args:
+            images (list): Image paths, or already decoded PIL images
+        
+        Returns:
+            list: One caption per image, in order
+        """
+        captions = [None] * len(images)
+        tensors = []
+        positions = []
+        timings = {"load": 0.0, "transform": 0.0}
+        
+        # Load and transform images
+        for index, image in enumerate(images):
+            start_time = time.perf_counter()
+            try:
+                if not isinstance(image, Image.Image):
+                    image = Image.open(image)
+                image = image.convert("RGB")
+            except Exception as e:
+                print(f"Error loading image: {e}")
+                captions[index] = "Error loading image"
+                continue
+            loaded_time = time.perf_counter()
+            tensors.append(self.transform(image))
+            positions.append(index)
+            timings["load"] += loaded_time - start_time
+            timings["transform"] += time.perf_counter() - loaded_time
+        
+        if not tensors:
+            self.last_timings = timings
+            return captions
         
-        input_tensor = self.transform(image).unsqueeze(0).to(self.device)
+        # Stack into a single (N, 3, 224, 224) batch
+        start_time = time.perf_counter()
+        input_tensor = torch.stack(tensors).to(self.device)
+        timings["transfer"] = time.perf_counter() - start_time
         
-        # Generate caption
+        # Generate captions
         with torch.no_grad():
+            start_time = time.perf_counter()
             output = self.model(input_tensor)
-            caption = self.model.caption_generator.decode(output[0])
+            if self.device.type == "mps":
+                # MPS runs asynchronously; wait so the forward pass is timed, not queued
+                torch.mps.synchronize()
+            timings["forward"] = time.perf_counter() - start_time
+            
+            start_time = time.perf_counter()
+            for row, index in enumerate(positions):
+                captions[index] = self.model.caption_generator.decode(output[row])
+            timings["decode"] = time.perf_counter() - start_time
         
-        return caption
+        self.last_timings = timings
+        return captions
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration for the combined app (see wsgi.py).
+"""
+
+import os
+import signal
+import threading
+
+bind = os.environ.get("BIND", "127.0.0.1:5000")
+
+# Exactly one worker process is supported: job state (/jobs/<id>, /results/<id>)
+# lives in that process's memory, so a second worker would answer 404 for jobs
+# submitted to the first. Concurrency comes from threads instead: inference
+# releases the GIL and the batchers group concurrent requests into one forward
+# pass, with a single copy of the model weights.
+worker_class = "gthread"
+workers = 1
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+
+# Long generations and SSE streams need more than the 30 second default
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+# Upper bound on draining after SIGTERM (the master kills the worker after this)
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "120"))
+
+def post_worker_init(worker):
+    """Warm up PRELOAD_MODELS and drain jobs on SIGTERM while still serving."""
+    from server import start_preload, drain
+    start_preload()
+    
+    def handle_term(sig, frame):
+        # Gunicorn's own handler stops the accept loop, so only call it once
+        # the queued jobs are done and clients have had a chance to fetch them
+        def drain_then_exit():
+            drain()
+            worker.handle_exit(sig, frame)
+        threading.Thread(target=drain_then_exit, name="drain", daemon=True).start()
+    
+    signal.signal(signal.SIGTERM, handle_term)
+
+def worker_exit(server, worker):
+    """Stop the batchers and the upload writer as the worker exits."""
+    from server import shutdown
+    shutdown()
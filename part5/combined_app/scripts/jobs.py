@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+"""
+In-process job queue for running inference outside the request handler.
+"""
+
+import time
+import uuid
+import queue
+import threading
+from collections import deque
+
+class QueueFull(Exception):
+    """Raised when the job queue is at capacity (the server should reply 429)."""
+
+class InvalidInput(ValueError):
+    """Raised by a job function when its input is unusable (the job ends "invalid", not "failed")."""
+
+class Job:
+    """A unit of work and its result."""
+    def __init__(self, kind, fn, args, kwargs):
+        """Initialize a queued job."""
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+    
+    def to_dict(self):
+        """Return the job state as a JSON-serializable dictionary."""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished
+        }
+
+class JobQueue:
+    """
+    Bounded job queue served by a fixed pool of worker threads.
+    
+    submit() raises QueueFull once max_depth jobs are waiting, so the
+    server can shed load with HTTP 429 instead of piling up requests.
+    Finished jobs are kept for ttl_seconds (at most max_finished of them)
+    so clients can fetch results; their inputs are dropped once they run.
+    If given, on_complete(job) is called on the worker after each job.
+    """
+    def __init__(self, workers=2, max_depth=32, ttl_seconds=600, max_finished=256, on_complete=None):
+        """Initialize the queue (worker threads start on first submit)."""
+        self.workers = workers
+        self.max_depth = max_depth
+        self.ttl_seconds = ttl_seconds
+        self.max_finished = max_finished
+        self.on_complete = on_complete
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._finished = deque()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+    
+    def start(self):
+        """Start the worker threads if they are not running."""
+        with self._lock:
+            if self._threads or self._closed:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+    
+    def submit(self, kind, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) to run on a worker thread.
+        
+        Args:
+            kind (str): Job type (e.g. "summary", "caption")
+            fn (callable): Function to run
+        
+        Returns:
+            Job: The queued job
+        
+        Raises:
+            QueueFull: If max_depth jobs are already waiting, or the queue is shutting down
+        """
+        self.start()
+        self._prune()
+        
+        with self._lock:
+            if self._closed:
+                raise QueueFull("Shutting down")
+            if self._queue.qsize() >= self.max_depth:
+                raise QueueFull(f"{self._queue.qsize()} jobs already queued")
+            job = Job(kind, fn, args, kwargs)
+            self._jobs[job.id] = job
+            self._queue.put(job)
+        
+        return job
+    
+    def get(self, job_id):
+        """Return the job with the given ID, or None."""
+        return self._jobs.get(job_id)
+    
+    def depth(self):
+        """Return the number of jobs waiting for a worker."""
+        return self._queue.qsize()
+    
+    def _worker(self):
+        """Run jobs until a None sentinel is received."""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            
+            job.status = "running"
+            job.started = time.time()
+            try:
+                job.result = job.fn(*job.args, **job.kwargs)
+                job.status = "done"
+            except InvalidInput as e:
+                job.error = str(e)
+                job.status = "invalid"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            # Release the inputs (e.g. upload bytes) while the result is retained
+            job.fn = job.args = job.kwargs = None
+            job.finished = time.time()
+            with self._lock:
+                self._finished.append(job)
+            job.done.set()
+            self._prune()
+            
+            if self.on_complete is not None:
+                try:
+                    self.on_complete(job)
+                except Exception as e:
+                    print(f"Error in job completion callback: {e}")
+    
+    def _prune(self):
+        """Forget finished jobs older than the TTL, and the oldest beyond max_finished."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            while self._finished and (len(self._finished) > self.max_finished
+                                      or self._finished[0].finished < cutoff):
+                job = self._finished.popleft()
+                self._jobs.pop(job.id, None)
+    
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and stop the workers once the queued jobs have run."""
+        with self._lock:
+            self._closed = True
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
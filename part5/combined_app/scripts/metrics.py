@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+"""
+Lightweight Prometheus-style metrics (counters, gauges and histograms).
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _label_key(labels):
+    """Return a hashable, ordered key for a label dictionary."""
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=()):
+    """Format a label key in the Prometheus text format."""
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    """Format a sample value."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+class Metric:
+    """
+    Base class for a named metric with optional labels.
+    
+    A metric either stores its own samples or, if callback is given, asks
+    the callback for them at scrape time. The callback returns a number or
+    a list of (labels, value) pairs.
+    """
+    type = "untyped"
+    
+    def __init__(self, name, documentation, callback=None):
+        """Initialize the metric."""
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def samples(self):
+        """Return (suffix, label key, extra labels, value) tuples for rendering."""
+        if self.callback is not None:
+            result = self.callback()
+            if isinstance(result, (int, float)):
+                result = [({}, result)]
+            return [("", _label_key(labels), (), value) for labels, value in result]
+        
+        with self._lock:
+            return [("", key, (), value) for key, value in self._values.items()]
+    
+    def render(self):
+        """Return the metric in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+    type = "counter"
+    
+    def inc(self, amount=1, **labels):
+        """Add to the counter."""
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+    type = "gauge"
+    
+    def set(self, value, **labels):
+        """Set the gauge."""
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+class Histogram(Metric):
+    """Distribution of observed values (usually durations in seconds)."""
+    type = "histogram"
+    
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        """Initialize the histogram."""
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value, **labels):
+        """Record one observation."""
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+    
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with block."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+    
+    def samples(self):
+        """Return cumulative bucket, sum and count samples."""
+        with self._lock:
+            states = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        
+        samples = []
+        for key, counts, total, count in states:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", key, (("le", _format_value(bound)),), cumulative))
+            samples.append(("_bucket", key, (("le", "+Inf"),), count))
+            samples.append(("_sum", key, (), total))
+            samples.append(("_count", key, (), count))
+        return samples
+
+class MetricsRegistry:
+    """Collection of metrics rendered together for a /metrics endpoint."""
+    def __init__(self):
+        """Initialize an empty registry."""
+        self.metrics = []
+    
+    def _add(self, metric):
+        """Register a metric and return it."""
+        self.metrics.append(metric)
+        return metric
+    
+    def counter(self, name, documentation, callback=None):
+        """Create and register a Counter."""
+        return self._add(Counter(name, documentation, callback))
+    
+    def gauge(self, name, documentation, callback=None):
+        """Create and register a Gauge."""
+        return self._add(Gauge(name, documentation, callback))
+    
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        """Create and register a Histogram."""
+        return self._add(Histogram(name, documentation, buckets))
+    
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        blocks = []
+        for metric in self.metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception as e:
+                # A failing callback should not break the whole scrape
+                print(f"Error collecting {metric.name}: {e}")
+        return "\n".join(blocks) + "\n"
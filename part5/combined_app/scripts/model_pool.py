@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+Lazy, thread-safe model loading for the combined app.
+"""
+
+import time
+import threading
+
+class LazyModel:
+    """Holds one model and loads it on first use."""
+    def __init__(self, name, factory):
+        """Initialize the holder (nothing is loaded yet)."""
+        self.name = name
+        self.factory = factory
+        self.state = "not_loaded"
+        self.error = None
+        self.load_seconds = None
+        self._instance = None
+        self._lock = threading.Lock()
+    
+    def get(self):
+        """Return the model, loading it first if needed."""
+        # Fast path: no locking once the model is loaded
+        if self._instance is not None:
+            return self._instance
+        
+        # Only one thread loads; the others wait for it
+        with self._lock:
+            if self._instance is None:
+                self.state = "loading"
+                start_time = time.perf_counter()
+                try:
+                    instance = self.factory()
+                except Exception as e:
+                    self.state = "failed"
+                    self.error = str(e)
+                    raise
+                self.load_seconds = time.perf_counter() - start_time
+                self.error = None
+                self._instance = instance
+                self.state = "ready"
+        
+        return self._instance
+    
+    def status(self):
+        """Return the load state as a dictionary."""
+        return {
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "error": self.error
+        }
+
+class ModelPool:
+    """Named set of lazily loaded models with optional warm-up."""
+    def __init__(self, **factories):
+        """Initialize the pool from name=factory keyword arguments."""
+        self.models = {name: LazyModel(name, factory) for name, factory in factories.items()}
+        self.preloaded = set()
+    
+    def __getitem__(self, name):
+        """Return the LazyModel with the given name."""
+        return self.models[name]
+    
+    def get(self, name):
+        """Return the loaded model with the given name."""
+        return self.models[name].get()
+    
+    def preload(self, names=None, background=True):
+        """
+        Load models ahead of the first request (a warm pool).
+        
+        Args:
+            names (list, optional): Models to load (default: all)
+            background (bool): Load in a background thread instead of blocking
+        """
+        names = list(names or self.models)
+        for name in names:
+            if name not in self.models:
+                raise ValueError(f"Unknown model: {name}")
+        self.preloaded.update(names)
+        
+        def load_all():
+            for name in names:
+                try:
+                    self.models[name].get()
+                except Exception as e:
+                    print(f"Failed to preload {name}: {e}")
+        
+        if background:
+            threading.Thread(target=load_all, name="model-preload", daemon=True).start()
+        else:
+            load_all()
+    
+    def is_ready(self):
+        """Return True once every preloaded model is ready."""
+        return all(self.models[name].state == "ready" for name in self.preloaded)
+    
+    def status(self):
+        """Return the load state of every model."""
+        return {name: model.status() for name, model in self.models.items()}
@@ -4,26 +4,371 @@
 Simple web server for AI with Mac demonstration.
 """
 
+import io
 import os
+import sys
+import json
+import time
 import uuid
-from flask import Flask, render_template, request, redirect, url_for
-from summarize import Summarizer
-from caption import ImageCaptioner
+import base64
+import argparse
+import importlib
+import psutil
+from flask import (Flask, Request, Response, g, render_template, request, redirect, url_for, jsonify,
+                   send_from_directory, stream_with_context)
+from PIL import Image
+from model_pool import ModelPool
+from batching import MicroBatcher
+from cache import ResultCache
+from uploads import UploadStore
+from jobs import JobQueue, QueueFull, InvalidInput
+from metrics import MetricsRegistry
+
+class InMemoryRequest(Request):
+    """Request that keeps uploaded files in memory instead of spooling them to disk."""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Safe because MAX_CONTENT_LENGTH bounds the request size
+        return io.BytesIO()
 
 app = Flask(__name__, template_folder="../templates", static_folder="../static")
+app.request_class = InMemoryRequest
+
+# Larger requests are rejected with a 413 before they are read
+MAX_UPLOAD_MB = float(os.environ.get("MAX_UPLOAD_MB", "16"))
+app.config["MAX_CONTENT_LENGTH"] = int(MAX_UPLOAD_MB * 1024 * 1024)
+
+# Uploads are only kept on disk if SAVE_UPLOADS is set; they are written in the
+# background and deleted after UPLOAD_RETENTION_HOURS
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "../uploads")
+uploads = None
+if os.environ.get("SAVE_UPLOADS", "") not in ("", "0"):
+    uploads = UploadStore(UPLOAD_DIR, retention_seconds=float(os.environ.get("UPLOAD_RETENTION_HOURS", "24")) * 3600)
+
+# Saved uploads are named by their decoded image format and served only with
+# the matching image content type (other formats are shown inline instead)
+UPLOAD_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif", "WEBP": ".webp", "BMP": ".bmp"}
+UPLOAD_MIMETYPES = {".jpg": "image/jpeg", ".png": "image/png", ".gif": "image/gif",
+                    ".webp": "image/webp", ".bmp": "image/bmp"}
+
+# Longest side of the inline preview shown when uploads are not saved
+THUMBNAIL_SIZE = 512
+
+# Metrics exposed at /metrics in the Prometheus text format
+metrics = MetricsRegistry()
+REQUEST_SECONDS = metrics.histogram("http_request_duration_seconds", "HTTP request latency by route.")
+STAGE_SECONDS = metrics.histogram("stage_duration_seconds", "Time spent in each processing stage.")
+JOBS_TOTAL = metrics.counter("jobs_total", "Finished jobs by kind and status.")
+TOKENS_TOTAL = metrics.counter("summarizer_generated_tokens_total", "Tokens generated by the summarizer.")
+TOKENS_PER_SECOND = metrics.gauge("summarizer_tokens_per_second", "Generation throughput of the last summary batch.")
+IMAGES_TOTAL = metrics.counter("captioner_images_total", "Images captioned.")
+IMAGES_PER_SECOND = metrics.gauge("captioner_images_per_second", "Throughput of the last caption batch.")
+
+# Model identifiers, used in result cache keys without loading the models
+SUMMARIZER_MODEL = os.environ.get("SUMMARIZER_MODEL", "models/gemma-2b-it-4bit")
+CAPTIONER_MODEL = "saahiluppal/catr:v3"
+
+# Models are loaded lazily on first use (see start_preload() for warm-up).
+# Their modules are imported by the factories too, so torch and mlx_lm are only
+# imported (and their memory paid) once a route needs them. No threads are
+# started at import, so this module can be imported before fork
+models = ModelPool(summarizer=lambda: importlib.import_module("summarize").Summarizer(SUMMARIZER_MODEL),
+                   captioner=lambda: importlib.import_module("caption").ImageCaptioner())
+
+# Results are cached by content hash, model and parameters; RESULT_CACHE_DIR
+# adds a disk tier that survives restarts
+result_cache = ResultCache(max_entries=int(os.environ.get("RESULT_CACHE_SIZE", "1024")),
+                           disk_path=os.environ.get("RESULT_CACHE_DIR") or None)
+
+# Generation parameters for summaries (part of the cache key)
+SUMMARY_PARAMS = {"max_length": 200, "temperature": 0.3}
 
-# Initialize models
-summarizer = Summarizer()
-captioner = ImageCaptioner()
+def caption_batch(images):
+    """Caption a batch of images and record per-stage timings."""
+    captioner = models.get("captioner")
+    start_time = time.perf_counter()
+    captions = captioner.generate_captions(images)
+    elapsed = time.perf_counter() - start_time
+    
+    for stage, seconds in captioner.last_timings.items():
+        STAGE_SECONDS.observe(seconds, stage=f"caption_{stage}")
+    IMAGES_TOTAL.inc(len(images))
+    if elapsed > 0:
+        IMAGES_PER_SECOND.set(len(images) / elapsed)
+    return captions
+
+def summary_batch(texts):
+    """Summarize a batch of texts and record generation metrics."""
+    summarizer = models.get("summarizer")
+    start_time = time.perf_counter()
+    summaries = summarizer.summarize_batch(texts, **SUMMARY_PARAMS)
+    elapsed = time.perf_counter() - start_time
+    
+    tokens = sum(summarizer.count_tokens(summary) for summary in summaries)
+    STAGE_SECONDS.observe(elapsed, stage="summary_generate")
+    TOKENS_TOTAL.inc(tokens)
+    if elapsed > 0:
+        TOKENS_PER_SECOND.set(tokens / elapsed)
+    return summaries
+
+# Concurrent caption requests are stacked into one forward pass of up to
+# CAPTION_BATCH_SIZE images, waiting at most CAPTION_BATCH_WAIT_MS for company
+caption_batcher = MicroBatcher(caption_batch,
+                               max_batch_size=int(os.environ.get("CAPTION_BATCH_SIZE", "8")),
+                               max_wait_ms=float(os.environ.get("CAPTION_BATCH_WAIT_MS", "10")),
+                               name="caption-batcher")
+
+# Concurrent summaries are generated together in the same way
+summary_batcher = MicroBatcher(summary_batch,
+                               max_batch_size=int(os.environ.get("SUMMARY_BATCH_SIZE", "4")),
+                               max_wait_ms=float(os.environ.get("SUMMARY_BATCH_WAIT_MS", "20")),
+                               name="summary-batcher")
+
+# Inference runs on a bounded worker pool; requests beyond JOB_QUEUE_DEPTH get a 429.
+# Workers mostly wait on the batchers, so there are enough of them to fill a batch
+def record_job(job):
+    """Record queue wait, run time and outcome of a finished job."""
+    STAGE_SECONDS.observe(job.started - job.created, stage="queue_wait")
+    STAGE_SECONDS.observe(job.finished - job.started, stage=f"{job.kind}_job")
+    JOBS_TOTAL.inc(kind=job.kind, status=job.status)
+
+jobs = JobQueue(workers=int(os.environ.get("JOB_WORKERS", "8")),
+                max_depth=int(os.environ.get("JOB_QUEUE_DEPTH", "32")),
+                max_finished=int(os.environ.get("JOB_MAX_FINISHED", "256")),
+                on_complete=record_job)
+
+def memory_usage():
+    """Report process memory and accelerator memory held by loaded models."""
+    samples = [({"kind": "process_rss"}, psutil.Process().memory_info().rss)]
+    
+    # Only query frameworks that are already loaded
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.backends.mps.is_available():
+        samples.append(({"kind": "mps_allocated"}, torch.mps.current_allocated_memory()))
+    mx = sys.modules.get("mlx.core")
+    if mx is not None:
+        get_active_memory = getattr(mx, "get_active_memory", None) or mx.metal.get_active_memory
+        samples.append(({"kind": "mlx_active"}, get_active_memory()))
+    return samples
 
-# Create upload directories
-os.makedirs("../uploads", exist_ok=True)
+def cache_lookups():
+    """Report result cache lookups by outcome."""
+    stats = result_cache.stats()
+    return [({"result": name}, stats[name]) for name in ("memory_hits", "disk_hits", "misses")]
+
+metrics.gauge("job_queue_depth", "Jobs waiting for a worker.", callback=lambda: jobs.depth())
+metrics.gauge("batcher_queue_depth", "Requests waiting for the next batch.",
+              callback=lambda: [({"batcher": "summary"}, summary_batcher.stats()["queued"]),
+                                ({"batcher": "caption"}, caption_batcher.stats()["queued"])])
+metrics.gauge("memory_bytes", "Process and model memory.", callback=memory_usage)
+metrics.gauge("model_loaded", "Whether each model is loaded (1) or not (0).",
+              callback=lambda: [({"model": name}, int(state["state"] == "ready"))
+                                for name, state in models.status().items()])
+metrics.counter("result_cache_lookups_total", "Result cache lookups by outcome.", callback=cache_lookups)
+metrics.gauge("result_cache_hit_ratio", "Fraction of result cache lookups that hit.",
+              callback=lambda: result_cache.stats()["hit_rate"])
+
+# Most texts or images accepted in one /api/v1 request
+API_MAX_BATCH = int(os.environ.get("API_MAX_BATCH", "64"))
+
+# Seconds a client is told to wait before retrying a rejected request
+RETRY_AFTER_SECONDS = 5
+
+# Seconds between SSE keep-alive events while a job is pending
+SSE_KEEPALIVE_SECONDS = 15
+
+def start_preload():
+    """Warm up the models named in PRELOAD_MODELS ("summarizer,captioner" or "all") in the background."""
+    preload = os.environ.get("PRELOAD_MODELS", "")
+    if preload:
+        models.preload(None if preload == "all" else preload.split(","))
+
+def drain(linger=None):
+    """
+    Stop taking jobs (new submits get a 429) and wait for the queued ones.
+    
+    Requests are still served meanwhile, and for linger seconds afterwards
+    (DRAIN_LINGER_SECONDS, default 5) so clients can fetch the last results.
+    """
+    if linger is None:
+        linger = float(os.environ.get("DRAIN_LINGER_SECONDS", "5"))
+    jobs.shutdown(wait=True)
+    time.sleep(linger)
+
+def shutdown():
+    """Stop the server: finish queued jobs, then stop the batchers and the upload writer."""
+    jobs.shutdown(wait=True)
+    summary_batcher.close()
+    caption_batcher.close()
+    if uploads:
+        uploads.close()
+
+@app.before_request
+def start_timer():
+    """Note when the request started."""
+    g.start_time = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    """Record the request latency by route."""
+    start_time = g.get("start_time")
+    if start_time is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - start_time, route=route,
+                                method=request.method, status=response.status_code)
+    return response
 
 @app.route("/")
 def index():
     """Render main page."""
     return render_template("index.html")
 
+@app.route("/ready")
+def ready():
+    """Report model load state (503 until preloaded models are ready)."""
+    return jsonify(ready=models.is_ready(), models=models.status()), 200 if models.is_ready() else 503
+
+def wants_json():
+    """Return True if the client prefers JSON over HTML."""
+    best = request.accept_mimetypes.best_match(["text/html", "application/json"])
+    return best == "application/json"
+
+def submit_job(kind, fn, *args):
+    """Queue an inference job and return the response for the client."""
+    try:
+        job = jobs.submit(kind, fn, *args)
+    except QueueFull:
+        message = "The server is busy, please try again shortly."
+        if wants_json():
+            response = jsonify(error=message)
+        else:
+            response = app.make_response(render_template("index.html", error=message))
+        response.status_code = 429
+        response.headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+        return response
+    
+    if wants_json():
+        response = jsonify(job_id=job.id,
+                           status_url=url_for("job_status", job_id=job.id),
+                           events_url=url_for("job_events", job_id=job.id))
+        response.status_code = 202
+        response.headers["Location"] = url_for("job_status", job_id=job.id)
+        return response
+    
+    return redirect(url_for("job_result", job_id=job.id), code=303)
+
+def generate_summaries(texts):
+    """Summarize texts on the summary batcher thread and wait for the results."""
+    futures = [summary_batcher.submit(text) for text in texts]
+    return [future.result() for future in futures]
+
+def summarize_texts(texts):
+    """
+    Summarize texts through the result cache and the summary batcher.
+    
+    Every cache miss is submitted to the batcher before waiting on any of
+    them, so the texts of one call can share a batch. Long texts are split
+    into chunks that go through the same batcher, so all generation runs
+    on the batcher thread and chunks batch with other requests.
+    """
+    keys = [ResultCache.key(text, SUMMARIZER_MODEL, **SUMMARY_PARAMS) for text in texts]
+    summaries = [result_cache.get(key) for key in keys]
+    if all(summary is not None for summary in summaries):
+        return summaries
+    
+    summarizer = models.get("summarizer")
+    long_texts = {index for index, text in enumerate(texts)
+                  if summaries[index] is None and summarizer.needs_chunking(text)}
+    pending = {index: summary_batcher.submit(text) for index, text in enumerate(texts)
+               if summaries[index] is None and index not in long_texts}
+    
+    for index, text in enumerate(texts):
+        if summaries[index] is not None:
+            continue
+        if index in pending:
+            summaries[index] = pending[index].result()
+        else:
+            with STAGE_SECONDS.time(stage="summary_long"):
+                summaries[index] = summarizer.summarize_long(text, batch_fn=generate_summaries, **SUMMARY_PARAMS)
+        result_cache.put(keys[index], summaries[index])
+    
+    return summaries
+
+def run_summary(text):
+    """Summarize text (runs on a job worker)."""
+    summary = summarize_texts([text])[0]
+    return {"result_type": "summary", "original": text, "result": summary, "framework": "MLX"}
+
+def thumbnail_data_uri(image):
+    """Return a small JPEG preview of an image as a data: URI."""
+    thumbnail = image.convert("RGB")
+    thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=85)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+def decode_image(data):
+    """Decode uploaded image bytes, raising InvalidInput (a ValueError) if they are not an image."""
+    try:
+        with STAGE_SECONDS.time(stage="image_decode"):
+            image = Image.open(io.BytesIO(data))
+            image.load()
+    except Exception:
+        raise InvalidInput("The uploaded file is not a valid image.")
+    return image
+
+def caption_images(datas, images):
+    """
+    Caption decoded images through the result cache and the caption batcher.
+    
+    Args:
+        datas (list): Raw image bytes (used for the cache keys)
+        images (list): The decoded PIL images
+    
+    Returns:
+        list: One caption per image, in order
+    """
+    keys = [ResultCache.key(data, CAPTIONER_MODEL) for data in datas]
+    captions = [result_cache.get(key) for key in keys]
+    
+    pending = {index: caption_batcher.submit(image) for index, image in enumerate(images)
+               if captions[index] is None}
+    for index, future in pending.items():
+        captions[index] = future.result()
+        result_cache.put(keys[index], captions[index])
+    
+    return captions
+
+def run_caption(data, upload_id):
+    """Caption an uploaded image (runs on a job worker)."""
+    image = decode_image(data)
+    
+    # Only persist uploads that decoded as a known image format, named by that
+    # format rather than the client's filename so they are never served as HTML
+    extension = UPLOAD_EXTENSIONS.get(image.format)
+    image_path = None
+    if uploads and extension:
+        filename = upload_id + extension
+        uploads.save(filename, data)
+        image_path = "../uploads/" + filename
+    caption = caption_images([data], [image])[0]
+    
+    if image_path is None:
+        image_path = thumbnail_data_uri(image)
+    return {"result_type": "caption", "image_path": image_path,
+            "result": caption, "framework": "PyTorch with Metal"}
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Expose metrics in the Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/stats")
+def stats():
+    """Report batcher metrics, the job queue depth and result cache counters."""
+    return jsonify(batchers={"summary": summary_batcher.stats(), "caption": caption_batcher.stats()},
+                   jobs={"queued": jobs.depth()},
+                   cache=result_cache.stats())
+
 @app.route("/summarize", methods=["POST"])
 def summarize_text():
     """Summarize text input using MLX."""
@@ -32,13 +377,7 @@ def summarize_text():
     if not text:
         return render_template("index.html", error="Please enter some text to summarize.")
     
-    summary = summarizer.summarize(text)
-    
-    return render_template("result.html", 
-                          result_type="summary",
-                          original=text,
-                          result=summary,
-                          framework="MLX")
+    return submit_job("summary", run_summary, text)
 
 @app.route("/caption", methods=["POST"])
 def caption_image():
@@ -50,19 +389,161 @@ def caption_image():
     if file.filename == "":
         return render_template("index.html", error="No image selected.")
     
-    # Save uploaded image
-    filename = str(uuid.uuid4()) + os.path.splitext(file.filename)[1]
-    filepath = os.path.join("../uploads", filename)
-    file.save(filepath)
+    # The upload is already in memory; it is saved (if enabled) once it decodes
+    data = file.read()
+    
+    return submit_job("caption", run_caption, data, str(uuid.uuid4()))
+
+@app.errorhandler(413)
+def upload_too_large(error):
+    """Reject requests larger than MAX_CONTENT_LENGTH."""
+    message = f"The upload is too large (limit {MAX_UPLOAD_MB:g} MB)."
+    if wants_json():
+        return jsonify(error=message), 413
+    return render_template("index.html", error=message), 413
+
+@app.route("/uploads/<path:filename>")
+def uploaded_file(filename):
+    """Serve a saved upload with a fixed image content type."""
+    if not uploads:
+        return jsonify(error="Uploads are not saved"), 404
+    mimetype = UPLOAD_MIMETYPES.get(os.path.splitext(filename)[1])
+    if mimetype is None:
+        return jsonify(error="Not found"), 404
+    response = send_from_directory(os.path.abspath(UPLOAD_DIR), filename, mimetype=mimetype)
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    return response
+
+def api_error(message, status=400):
+    """Return a JSON error response."""
+    return jsonify(error=message), status
+
+@app.route("/api/v1/summarize", methods=["POST"])
+def api_summarize():
+    """
+    Summarize one or more texts and return JSON.
+    
+    Body: {"texts": ["...", ...]} (or {"text": "..."}).
+    Response: {"model": ..., "summaries": ["...", ...]} in request order.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return api_error("Expected a JSON object body")
+    
+    texts = body.get("texts", [body["text"]] if "text" in body else None)
+    if not isinstance(texts, list) or not texts or not all(isinstance(text, str) and text for text in texts):
+        return api_error('"texts" must be a non-empty list of non-empty strings')
+    if len(texts) > API_MAX_BATCH:
+        return api_error(f"At most {API_MAX_BATCH} texts per request", 413)
+    
+    summaries = summarize_texts(texts)
+    return jsonify(model=SUMMARIZER_MODEL, summaries=summaries)
+
+@app.route("/api/v1/caption", methods=["POST"])
+def api_caption():
+    """
+    Caption one or more images and return JSON.
+    
+    Body: multipart form with one or more "images" (or "image") files, or
+    JSON {"images": ["<base64>", ...]}.
+    Response: {"model": ..., "captions": [{"caption": ...} or {"error": ...}, ...]}
+    in request order.
+    """
+    if request.files:
+        files = request.files.getlist("images") or request.files.getlist("image")
+        names = [file.filename for file in files]
+        datas = [file.read() for file in files]
+    else:
+        body = request.get_json(silent=True)
+        encoded = body.get("images") if isinstance(body, dict) else None
+        if not isinstance(encoded, list):
+            return api_error('Expected "images" files or a JSON body with an "images" list')
+        try:
+            datas = [base64.b64decode(item, validate=True) for item in encoded]
+        except (TypeError, ValueError):
+            return api_error('"images" must be base64-encoded strings')
+        names = [None] * len(datas)
     
-    # Generate caption
-    caption = captioner.generate_caption(filepath)
+    if not datas:
+        return api_error("No images provided")
+    if len(datas) > API_MAX_BATCH:
+        return api_error(f"At most {API_MAX_BATCH} images per request", 413)
     
-    return render_template("result.html",
-                          result_type="caption",
-                          image_path="../uploads/" + filename,
-                          result=caption,
-                          framework="PyTorch with Metal")
+    # Invalid images get a per-item error instead of failing the whole batch
+    results = [{"filename": name} if name else {} for name in names]
+    valid = []
+    for index, data in enumerate(datas):
+        try:
+            valid.append((index, data, decode_image(data)))
+        except ValueError as e:
+            results[index]["error"] = str(e)
+    
+    if valid:
+        captions = caption_images([data for _, data, _ in valid], [image for _, _, image in valid])
+        for (index, _, _), caption in zip(valid, captions):
+            results[index]["caption"] = caption
+    
+    return jsonify(model=CAPTIONER_MODEL, captions=results)
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    """Return the state (and result, once done) of a job as JSON."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    return jsonify(job.to_dict())
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Stream job state changes as Server-Sent Events until the job finishes."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    
+    # Send the current state right away, then again on each keep-alive and on completion
+    def events():
+        while True:
+            yield f"data: {json.dumps(job.to_dict())}\n\n"
+            if job.done.is_set():
+                break
+            job.done.wait(SSE_KEEPALIVE_SECONDS)
+    
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/results/<job_id>")
+def job_result(job_id):
+    """Render a job's result page (or a pending page until it finishes)."""
+    job = jobs.get(job_id)
+    if job is None:
+        return render_template("index.html", error="Result not found or expired."), 404
+    if job.status == "invalid":
+        return render_template("index.html", error=job.error), 400
+    if job.status == "failed":
+        return render_template("index.html", error=f"Processing failed: {job.error}"), 500
+    if job.status != "done":
+        return render_template("pending.html", job_id=job.id, kind=job.kind, status=job.status)
+    with STAGE_SECONDS.time(stage="render"):
+        return render_template("result.html", **job.result)
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    parser = argparse.ArgumentParser(description="AI with Mac demonstration server")
+    parser.add_argument("--preload", nargs="*", choices=["summarizer", "captioner"],
+                        help="Load these models (all if none given) before serving requests "
+                             "(otherwise PRELOAD_MODELS loads them in the background)")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=5000, help="Port to bind")
+    parser.add_argument("--debug", action="store_true", help="Enable the Flask debugger")
+    args = parser.parse_args()
+    
+    if args.preload is not None:
+        models.preload(args.preload or None, background=False)
+    else:
+        start_preload()
+    
+    # Development server only (see wsgi.py for production); the reloader is
+    # off because it would load every model a second time
+    try:
+        app.run(host=args.host, port=args.port, debug=args.debug, threaded=True, use_reloader=False)
+    finally:
+        shutdown()
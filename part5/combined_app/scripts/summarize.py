@@ -5,8 +5,25 @@ Text summarization using MLX.
 """
 
 import os
+import re
+import hashlib
 import mlx.core as mx
 from mlx_lm import generate, load
+from cache import ResultCache
+
+# Batched generation is only available in newer mlx_lm releases
+try:
+    from mlx_lm import batch_generate
+    from mlx_lm.sample_utils import make_sampler
+except ImportError:
+    batch_generate = None
+
+# Source tokens per chunk when summarizing long texts
+CHUNK_TOKENS = 1024
+
+# Chunks are also ended at content-defined points once they are at least half
+# full (about 1 in 4 units), so an edit only moves boundaries up to the next one
+BOUNDARY_HASH_LIMIT = 64
 
 class Summarizer:
     """Text summarizer using MLX."""
@@ -23,15 +40,21 @@ class Summarizer:
         
         print(f"Loading summarization model from {model_path}...")
         self.model, self.tokenizer = load(model_path)
+        self.model_id = model_path
+        self.chunk_summaries = ResultCache(max_entries=4096)
         print("Summarization model loaded successfully!")
     
-    def summarize(self, text, max_length=200, temperature=0.3):
-        """Summarize the given text."""
-        prompt = f"""Please summarize the following text concisely:
+    def _prompt(self, text):
+        """Build the summarization prompt for a text."""
+        return f"""Please summarize the following text concisely:
 
 Text: {text}
 
 Summary:"""
+    
+    def summarize(self, text, max_length=200, temperature=0.3):
+        """Summarize the given text."""
+        prompt = self._prompt(text)
         
         # Generate summary
         gen_config = {
@@ -45,6 +68,134 @@ Summary:"""
         summary = self.tokenizer.decode(generated_tokens[len(tokens):])
         
         return summary.strip()
+    
+    def summarize_batch(self, texts, max_length=200, temperature=0.3):
+        """
+        Summarize several texts together.
+        
+        Uses mlx_lm.batch_generate (one padded batch decoded in lockstep) when
+        it is available, and falls back to one generate call per text.
+        
+        Args:
+            texts (list): Texts to summarize
+            max_length (int): Maximum tokens per summary
+            temperature (float): Sampling temperature
+        
+        Returns:
+            list: One summary per text, in order
+        """
+        if batch_generate is None or len(texts) == 1:
+            return [self.summarize(text, max_length, temperature) for text in texts]
+        
+        prompts = [self.tokenizer.encode(self._prompt(text)) for text in texts]
+        response = batch_generate(self.model, self.tokenizer, prompts,
+                                  max_tokens=max_length,
+                                  sampler=make_sampler(temp=temperature, top_p=0.9))
+        return [text.strip() for text in response.texts]
+
+    def count_tokens(self, text):
+        """Return the number of tokens in a text."""
+        return len(self.tokenizer.encode(text))
+    
+    def needs_chunking(self, text, chunk_tokens=CHUNK_TOKENS):
+        """Return True if a text is too long for one prompt and needs summarize_long()."""
+        return self.count_tokens(text) > chunk_tokens
+    
+    def summarize_long(self, text, max_length=200, temperature=0.3,
+                       chunk_tokens=CHUNK_TOKENS, batch_size=4, batch_fn=None):
+        """
+        Summarize a text of any length with hierarchical map-reduce.
+        
+        The text is split into chunks of at most chunk_tokens tokens, the
+        chunks are summarized in batches, and the joined partial summaries
+        are summarized again the same way until they fit in one chunk.
+        Chunk summaries are cached by chunk hash, so re-summarizing an
+        edited document only recomputes the chunks that changed.
+        
+        Args:
+            text (str): Text to summarize
+            max_length (int): Maximum tokens per summary
+            temperature (float): Sampling temperature
+            chunk_tokens (int): Maximum tokens per chunk
+            batch_size (int): Chunks summarized per batch (without batch_fn)
+            batch_fn (callable, optional): Summarizes a list of texts with
+                these settings and returns the summaries in order, so a
+                server can run all generation on its own batching thread
+                (default: summarize_batch, batch_size texts at a time)
+        
+        Returns:
+            str: The summary
+        """
+        if chunk_tokens < 2 * max_length:
+            # Otherwise the merged summaries might not shrink between levels
+            raise ValueError("chunk_tokens must be at least twice max_length")
+        
+        if batch_fn is None:
+            def batch_fn(texts):
+                summaries = []
+                for start in range(0, len(texts), batch_size):
+                    summaries += self.summarize_batch(texts[start:start + batch_size], max_length, temperature)
+                return summaries
+        
+        while True:
+            if self.count_tokens(text) <= chunk_tokens:
+                return batch_fn([text])[0]
+            
+            chunks = self._split(text, chunk_tokens)
+            summaries = self._summarize_chunks(chunks, max_length, temperature, batch_fn)
+            text = "\n\n".join(summaries)
+    
+    def _split(self, text, chunk_tokens):
+        """Split a text into token-bounded chunks along paragraph and sentence boundaries."""
+        # Units are paragraphs, or sentences (hard-split by tokens if needed) of long paragraphs
+        units = []
+        for paragraph in re.split(r"\n\s*\n", text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            count = self.count_tokens(paragraph)
+            if count <= chunk_tokens:
+                units.append((paragraph, count))
+                continue
+            for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+                tokens = self.tokenizer.encode(sentence)
+                for start in range(0, len(tokens), chunk_tokens):
+                    part = tokens[start:start + chunk_tokens]
+                    units.append((self.tokenizer.decode(part), len(part)))
+        
+        # Pack units greedily into chunks
+        chunks = []
+        current = []
+        current_tokens = 0
+        for unit, count in units:
+            if current and current_tokens + count > chunk_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += count
+            if (current_tokens >= chunk_tokens // 2 and
+                    hashlib.sha256(unit.encode()).digest()[0] < BOUNDARY_HASH_LIMIT):
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+        if current:
+            chunks.append("\n\n".join(current))
+        
+        return chunks
+    
+    def _summarize_chunks(self, chunks, max_length, temperature, batch_fn):
+        """Summarize the chunks that are not cached with batch_fn, reusing cached chunk summaries."""
+        keys = [ResultCache.key(chunk, self.model_id, max_length=max_length, temperature=temperature)
+                for chunk in chunks]
+        results = [self.chunk_summaries.get(key) for key in keys]
+        
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            summaries = batch_fn([chunks[index] for index in missing])
+            for index, summary in zip(missing, summaries):
+                self.chunk_summaries.put(keys[index], summary)
+                results[index] = summary
+        
+        return results
 
 # Example usage
 if __name__ == "__main__":
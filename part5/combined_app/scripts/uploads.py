@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""
+Optional background persistence of uploaded images.
+"""
+
+import os
+import time
+import uuid
+import queue
+import threading
+
+class UploadStore:
+    """
+    Saves uploads on a background thread and deletes them after a retention period.
+    
+    save() only queues the data, so request handlers never wait on disk.
+    A sweeper thread removes files older than retention_seconds every
+    sweep_interval seconds.
+    """
+    def __init__(self, directory, retention_seconds=24 * 3600, sweep_interval=3600):
+        """Initialize the store (threads start on first save)."""
+        self.directory = directory
+        self.retention_seconds = retention_seconds
+        self.sweep_interval = sweep_interval
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+    
+    def start(self):
+        """Start the writer and sweeper threads if they are not running."""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for target, name in ((self._writer, "upload-writer"), (self._sweeper, "upload-sweeper")):
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+    
+    def save(self, filename, data):
+        """Queue an upload to be written as directory/filename."""
+        self.start()
+        self._queue.put((filename, data))
+    
+    def _writer(self):
+        """Write queued uploads until a None sentinel is received."""
+        os.makedirs(self.directory, exist_ok=True)
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                break
+            
+            filename, data = entry
+            path = os.path.join(self.directory, os.path.basename(filename))
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Error saving upload {filename}: {e}")
+    
+    def _sweeper(self):
+        """Delete expired uploads periodically until stopped."""
+        while not self._stop.is_set():
+            self.sweep()
+            self._stop.wait(self.sweep_interval)
+    
+    def sweep(self):
+        """
+        Delete uploads older than the retention period.
+        
+        Returns:
+            int: Number of files deleted
+        """
+        cutoff = time.time() - self.retention_seconds
+        deleted = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+        
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    deleted += 1
+            except OSError:
+                continue
+        return deleted
+    
+    def close(self):
+        """Write the queued uploads, then stop both threads."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if threads:
+            self._queue.put(None)
+            self._stop.set()
+            for thread in threads:
+                thread.join()
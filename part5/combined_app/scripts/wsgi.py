@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+
+"""
+WSGI entry point for serving the combined app with a production server.
+
+Run from this directory (one worker process; see gunicorn.conf.py):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from server import app
@@ -5,13 +5,23 @@ Real-time image classification using PyTorch with Metal acceleration.
 """
 
 import os
+import csv
+import sys
+import glob
+import json
 import time
 import argparse
+import collections
+import concurrent.futures
+import numpy as np
 import torch
 import torchvision.transforms as transforms
 import torchvision.models as models
 from PIL import Image
 
+# File extensions picked up in directory mode
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp", ".tif", ".tiff"}
+
 class ImageClassifier:
     """Real-time image classifier using PyTorch with Metal acceleration."""
     def __init__(self, model_name="mobilenet_v3_small"):
@@ -63,24 +73,151 @@ class ImageClassifier:
             return None
         
         input_tensor = self.transform(image).unsqueeze(0).to(self.device)
+        self._synchronize()
         
-        # Perform inference
-        start_time = time.time()
+        # Perform inference (synchronize so the timing covers the work, not just the kernel launches)
+        start_time = time.perf_counter()
         with torch.no_grad():
             output = self.model(input_tensor)
-        inference_time = time.time() - start_time
+        self._synchronize()
+        inference_time = time.perf_counter() - start_time
         
         # Get top-5 predictions
-        probabilities = torch.nn.functional.softmax(output[0], dim=0)
-        top5_prob, top5_indices = torch.topk(probabilities, 5)
-        
-        # Convert to human-readable results
-        results = []
-        for i, (prob, idx) in enumerate(zip(top5_prob, top5_indices)):
-            class_name = self.class_names[idx]
-            results.append((class_name, prob.item()))
+        results = self._top_k(output)[0]
         
         return results, inference_time
+    
+    def _synchronize(self):
+        """Wait for queued GPU work to finish (MPS and CUDA run asynchronously)."""
+        if self.device.type == "mps":
+            torch.mps.synchronize()
+        elif self.device.type == "cuda":
+            torch.cuda.synchronize()
+    
+    def profile(self, image_path, iterations=50, warmup=5, batch_size=1):
+        """
+        Measure preprocessing and inference latency over repeated runs.
+        
+        Each iteration decodes and transforms the image (preprocessing,
+        including the copy to the device) and then runs the model
+        (inference), synchronizing the device after each stage. Warm-up
+        iterations run first and are not recorded, so one-off costs such
+        as kernel compilation do not skew the results.
+        
+        Args:
+            image_path (str): Image to classify
+            iterations (int): Timed iterations
+            warmup (int): Untimed warm-up iterations
+            batch_size (int): Copies of the image per forward pass
+        
+        Returns:
+            dict: Latency statistics in milliseconds for "preprocess", "inference" and "total"
+        """
+        timings = {"preprocess": [], "inference": []}
+        
+        with torch.no_grad():
+            for iteration in range(warmup + iterations):
+                start_time = time.perf_counter()
+                image = Image.open(image_path).convert("RGB")
+                input_tensor = self.transform(image).unsqueeze(0).repeat(batch_size, 1, 1, 1).to(self.device)
+                self._synchronize()
+                preprocessed_time = time.perf_counter()
+                
+                self.model(input_tensor)
+                self._synchronize()
+                finished_time = time.perf_counter()
+                
+                if iteration >= warmup:
+                    timings["preprocess"].append(preprocessed_time - start_time)
+                    timings["inference"].append(finished_time - preprocessed_time)
+        
+        timings["total"] = [p + i for p, i in zip(timings["preprocess"], timings["inference"])]
+        return {stage: latency_stats(values) for stage, values in timings.items()}
+    
+    def _top_k(self, output, k=5):
+        """Convert a batch of logits to per-image lists of (class name, probability)."""
+        probabilities = torch.nn.functional.softmax(output, dim=1)
+        top_prob, top_indices = torch.topk(probabilities, k, dim=1)
+        
+        # One transfer for the whole batch instead of one .item() per value
+        top_prob = top_prob.cpu().tolist()
+        top_indices = top_indices.cpu().tolist()
+        return [[(self.class_names[idx], prob) for prob, idx in zip(probs, indices)]
+                for probs, indices in zip(top_prob, top_indices)]
+    
+    def _load_tensor(self, image_path):
+        """Decode and transform one image (runs on a loader thread)."""
+        image = Image.open(image_path).convert("RGB")
+        return self.transform(image)
+    
+    def classify_batch(self, tensors):
+        """
+        Classify a batch of transformed images in one forward pass.
+        
+        Args:
+            tensors (list): Image tensors from the transform
+        
+        Returns:
+            list: Top-5 (class name, probability) lists, one per image
+        """
+        input_tensor = torch.stack(tensors).to(self.device)
+        with torch.no_grad():
+            output = self.model(input_tensor)
+        return self._top_k(output)
+    
+    def classify_paths(self, image_paths, batch_size=32, workers=4, prefetch_batches=2):
+        """
+        Classify many images, overlapping decoding with inference.
+        
+        Images are decoded and transformed on a thread pool that keeps up
+        to prefetch_batches batches ahead of the model, so the next batch
+        is being prepared while the current one runs.
+        
+        Args:
+            image_paths (iterable): Image paths
+            batch_size (int): Images per forward pass
+            workers (int): Loader threads
+            prefetch_batches (int): Batches to prepare ahead of inference
+        
+        Yields:
+            dict: {"path", "predictions"} or {"path", "error"} per image, in input order
+        """
+        paths = iter(image_paths)
+        pending = collections.deque()
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            def fill():
+                while len(pending) < batch_size * (prefetch_batches + 1):
+                    path = next(paths, None)
+                    if path is None:
+                        return
+                    pending.append((path, pool.submit(self._load_tensor, path)))
+            
+            fill()
+            while pending:
+                batch = [pending.popleft() for _ in range(min(batch_size, len(pending)))]
+                
+                # Queue more decoding before blocking on this batch
+                fill()
+                
+                loaded = []
+                failed = {}
+                for path, future in batch:
+                    try:
+                        loaded.append((path, future.result()))
+                    except Exception as e:
+                        failed[path] = str(e)
+                
+                predictions = {}
+                if loaded:
+                    results = self.classify_batch([tensor for _, tensor in loaded])
+                    predictions = {path: result for (path, _), result in zip(loaded, results)}
+                
+                for path, _ in batch:
+                    if path in predictions:
+                        yield {"path": path, "predictions": predictions[path]}
+                    else:
+                        yield {"path": path, "error": failed[path]}
 
 def ensure_imagenet_labels():
     """Ensure ImageNet class labels file exists."""
@@ -93,20 +230,152 @@ def ensure_imagenet_labels():
         url = "https://raw.githubusercontent.com/pytorch/vision/main/torchvision/models/imagenet_classes.txt"
         urllib.request.urlretrieve(url, labels_file)
 
+def latency_stats(seconds):
+    """
+    Summarize latency samples.
+    
+    Args:
+        seconds (list): Durations in seconds
+    
+    Returns:
+        dict: mean, min, max, p50, p95 and p99 in milliseconds
+    """
+    values = np.array(seconds) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean": float(values.mean()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99)
+    }
+
+def find_images(directory=None, pattern=None):
+    """
+    List image files in a directory (recursively) or matching a glob pattern.
+    
+    Args:
+        directory (str, optional): Directory to search
+        pattern (str, optional): Glob pattern (** matches subdirectories)
+    
+    Returns:
+        list: Sorted image paths
+    """
+    if pattern:
+        paths = glob.glob(pattern, recursive=True)
+    else:
+        paths = [os.path.join(root, filename)
+                 for root, _, filenames in os.walk(directory) for filename in filenames]
+    return sorted(path for path in paths
+                  if os.path.isfile(path) and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS)
+
+def write_results(results, output_file=None):
+    """
+    Stream classification results to CSV or JSONL as they arrive.
+    
+    Args:
+        results (iterable): Result dicts from classify_paths
+        output_file (str, optional): .csv or .jsonl path (default: JSONL to stdout)
+    
+    Returns:
+        tuple: (images classified, images that failed)
+    """
+    is_csv = output_file is not None and output_file.endswith(".csv")
+    f = open(output_file, "w", newline="") if output_file else sys.stdout
+    classified = failed = 0
+    
+    try:
+        writer = None
+        if is_csv:
+            writer = csv.writer(f)
+            writer.writerow(["path"] + [f"{field}_{rank}" for rank in range(1, 6)
+                                        for field in ("label", "probability")] + ["error"])
+        
+        for result in results:
+            if "error" in result:
+                failed += 1
+            else:
+                classified += 1
+            
+            if writer:
+                row = [result["path"]]
+                for class_name, probability in result.get("predictions", []):
+                    row += [class_name, f"{probability:.6f}"]
+                row += [""] * (11 - len(row))
+                writer.writerow(row + [result.get("error", "")])
+            else:
+                record = dict(result)
+                if "predictions" in record:
+                    record["predictions"] = [{"label": class_name, "probability": probability}
+                                             for class_name, probability in record["predictions"]]
+                f.write(json.dumps(record) + "\n")
+    finally:
+        if output_file:
+            f.close()
+    
+    return classified, failed
+
 def main():
     """Main function."""
     parser = argparse.ArgumentParser(description="Real-time image classification using PyTorch with Metal")
     parser.add_argument("--model", type=str, default="mobilenet_v3_small",
                         choices=["mobilenet_v3_small", "resnet18", "efficientnet_b0"],
                         help="Model architecture to use")
-    parser.add_argument("--image", type=str, required=True,
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--image", type=str,
                         help="Path to image for classification")
+    source.add_argument("--dir", type=str,
+                        help="Classify every image in this directory (recursively)")
+    source.add_argument("--glob", type=str,
+                        help="Classify every image matching this glob pattern")
+    parser.add_argument("--output", type=str,
+                        help="Write directory/glob results to this .csv or .jsonl file (default: JSONL on stdout)")
+    parser.add_argument("--batch-size", type=int,
+                        help="Images per forward pass (default: 32 in directory/glob mode, 1 in profile mode)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Image decoding threads in directory/glob mode")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile --image latency instead of classifying it once")
+    parser.add_argument("--warmup", type=int, default=5,
+                        help="Untimed warm-up iterations in profile mode")
+    parser.add_argument("--iterations", type=int, default=50,
+                        help="Timed iterations in profile mode")
     args = parser.parse_args()
     
+    if args.profile and not args.image:
+        parser.error("--profile requires --image")
+    
     ensure_imagenet_labels()
     
     classifier = ImageClassifier(args.model)
     
+    if args.dir or args.glob:
+        image_paths = find_images(args.dir, args.glob)
+        print(f"\nClassifying {len(image_paths)} images...", file=sys.stderr)
+        
+        start_time = time.perf_counter()
+        results = classifier.classify_paths(image_paths, args.batch_size or 32, args.workers)
+        classified, failed = write_results(results, args.output)
+        elapsed = time.perf_counter() - start_time
+        
+        rate = classified / elapsed if elapsed > 0 else 0.0
+        print(f"Classified {classified} images ({failed} failed) in {elapsed:.2f} s: "
+              f"{rate:.1f} images/sec", file=sys.stderr)
+        return
+    
+    if args.profile:
+        batch_size = args.batch_size or 1
+        print(f"\nProfiling {args.image}: {args.warmup} warm-up + {args.iterations} timed iterations, "
+              f"batch size {batch_size}, device {classifier.device}")
+        stats = classifier.profile(args.image, args.iterations, args.warmup, batch_size)
+        
+        print(f"\n{'Stage':<12} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'min':>9} {'max':>9}  (ms)")
+        for stage, values in stats.items():
+            print(f"{stage:<12} " + " ".join(f"{values[key]:>9.2f}" for key in
+                                             ("mean", "p50", "p95", "p99", "min", "max")))
+        return
+    
     print(f"\nClassifying image: {args.image}")
     results, inference_time = classifier.classify_image(args.image)
     
@@ -7,7 +7,11 @@ Semantic versioning utility for ML models.
 import os
 import re
 import json
+import uuid
+import bisect
+import hashlib
 import argparse
+import subprocess
 from datetime import datetime
 
 class MLVersioning:
@@ -99,11 +103,24 @@ class MLVersioning:
             model_metadata.update(metadata)
         
         # Save metadata
-        with open(metadata_file, 'w') as f:
-            json.dump(model_metadata, f, indent=2)
+        MLVersioning.write_metadata(metadata_file, model_metadata)
         
         return new_version
     
+    @staticmethod
+    def write_metadata(metadata_file, metadata):
+        """
+        Write a metadata file atomically (write to a temp file, then rename).
+        
+        Args:
+            metadata_file (str): Path to metadata.json
+            metadata (dict): Metadata to write
+        """
+        tmp_file = f"{metadata_file}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_file, metadata_file)
+    
     @staticmethod
     def tag_model_version(model_dir, version=None):
         """
@@ -140,7 +157,11 @@ class MLVersioning:
             
             # Create git tag
             commit_msg = f"Model {model_name} version {version}"
-            os.system(f'git tag -a "{tag_name}" -m "{commit_msg}"')
+            result = subprocess.run(["git", "tag", "-a", tag_name, "-m", commit_msg],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"Error creating git tag {tag_name}: {result.stderr.strip()}")
+                return False
             
             print(f"Created git tag: {tag_name}")
             return True
@@ -148,6 +169,363 @@ class MLVersioning:
         except Exception as e:
             print(f"Error creating git tag: {e}")
             return False
+    
+    @staticmethod
+    def find_model_dirs(root_dir):
+        """
+        Find model directories (directories containing metadata.json).
+        
+        Args:
+            root_dir (str): Directory to scan
+            
+        Returns:
+            list: Sorted model directory paths
+        """
+        model_dirs = []
+        for dirpath, _, filenames in os.walk(root_dir):
+            if "metadata.json" in filenames:
+                model_dirs.append(dirpath)
+        return sorted(model_dirs)
+    
+    @staticmethod
+    def batch_update_versions(model_dirs, level="patch", metadata=None):
+        """
+        Increment the version of many models.
+        
+        Each model is bumped in turn, and its metadata file is written
+        atomically, so a failure never leaves a half-written file. A model
+        that fails is reported and does not stop the others.
+        
+        Args:
+            model_dirs (list): Model directories
+            level (str): Level to increment
+            metadata (dict, optional): Additional metadata for every model
+            
+        Returns:
+            dict: Model directory -> {"version": str} or {"error": str}
+        """
+        results = {}
+        for model_dir in model_dirs:
+            try:
+                results[model_dir] = {
+                    "version": MLVersioning.update_model_version(model_dir, level, metadata)
+                }
+            except (OSError, ValueError) as e:
+                results[model_dir] = {"error": str(e)}
+        return results
+    
+    @staticmethod
+    def is_valid_tag_name(tag_name):
+        """
+        Check a tag name against git's ref name rules (see git check-ref-format).
+        
+        Args:
+            tag_name (str): Tag name
+            
+        Returns:
+            bool: True if git would accept refs/tags/<tag_name>
+        """
+        if not tag_name or tag_name == "@" or tag_name.endswith(("/", ".")):
+            return False
+        if ".." in tag_name or "@{" in tag_name or "//" in tag_name:
+            return False
+        if re.search(r'[\x00-\x20\x7f~^:?*\[\\]', tag_name):
+            return False
+        return all(component and not component.startswith(".") and not component.endswith(".lock")
+                   for component in tag_name.split("/"))
+    
+    @staticmethod
+    def batch_tag_versions(model_dirs, repo_dir="."):
+        """
+        Create annotated git tags for many model versions in one git call.
+        
+        Versions are read from each metadata.json. Tags are created with a
+        single `git fast-import` run pointing at HEAD, instead of one
+        `git tag` process per model. Each model is checked first, and
+        problems are reported against that model only: invalid tag names,
+        existing tags (which are not moved), and metadata.json files with
+        uncommitted changes (HEAD would not contain the tagged version).
+        If fast-import still fails, the tags are retried one by one so
+        each error is attributed to its own model.
+        
+        Args:
+            model_dirs (list): Model directories
+            repo_dir (str): Git repository to tag
+            
+        Returns:
+            dict: Model directory -> {"tag": str, "success": bool, "error": str or None}
+        """
+        def git(*args, **kwargs):
+            return subprocess.run(["git", *args], cwd=repo_dir, capture_output=True, text=True, **kwargs)
+        
+        results = {}
+        head = git("rev-parse", "HEAD")
+        ident = git("var", "GIT_COMMITTER_IDENT")
+        existing = git("for-each-ref", "--format=%(refname:short)", "refs/tags")
+        for result in (head, ident, existing):
+            if result.returncode != 0:
+                error = result.stderr.strip()
+                return {model_dir: {"tag": None, "success": False, "error": error}
+                        for model_dir in model_dirs}
+        existing_tags = set(existing.stdout.split())
+        
+        # Metadata files whose working copy differs from HEAD (one git call for all)
+        metadata_files = {model_dir: os.path.abspath(os.path.join(model_dir, "metadata.json"))
+                          for model_dir in model_dirs}
+        status = git("status", "--porcelain", "-z", "--", *metadata_files.values())
+        dirty = set()
+        if status.returncode == 0:
+            top = git("rev-parse", "--show-toplevel").stdout.strip()
+            for entry in status.stdout.split("\0"):
+                if entry:
+                    dirty.add(os.path.normcase(os.path.abspath(os.path.join(top, entry[3:]))))
+        
+        # Work out every tag before touching the repository
+        stream = []
+        pending = []
+        for model_dir in model_dirs:
+            model_name = os.path.basename(os.path.normpath(model_dir))
+            try:
+                with open(os.path.join(model_dir, "metadata.json"), 'r') as f:
+                    version = json.load(f).get("version")
+            except (OSError, ValueError) as e:
+                results[model_dir] = {"tag": None, "success": False, "error": str(e)}
+                continue
+            
+            if not version:
+                results[model_dir] = {"tag": None, "success": False,
+                                      "error": "Version not found in metadata"}
+                continue
+            
+            tag_name = f"model-{model_name}-{version}"
+            if not MLVersioning.is_valid_tag_name(tag_name):
+                results[model_dir] = {"tag": tag_name, "success": False,
+                                      "error": "Invalid git tag name"}
+                continue
+            
+            if tag_name in existing_tags:
+                results[model_dir] = {"tag": tag_name, "success": False,
+                                      "error": "Tag already exists"}
+                continue
+            
+            if os.path.normcase(metadata_files[model_dir]) in dirty:
+                results[model_dir] = {"tag": tag_name, "success": False,
+                                      "error": "metadata.json has uncommitted changes; commit them before tagging"}
+                continue
+            
+            message = f"Model {model_name} version {version}\n"
+            stream.append(f"tag {tag_name}\nfrom {head.stdout.strip()}\n"
+                          f"tagger {ident.stdout.strip()}\n"
+                          f"data {len(message.encode())}\n{message}\n")
+            pending.append((model_dir, tag_name, message))
+            existing_tags.add(tag_name)
+        
+        # Create all tags in a single git invocation
+        if pending:
+            result = git("fast-import", "--quiet", input="".join(stream))
+            if result.returncode == 0:
+                for model_dir, tag_name, _ in pending:
+                    results[model_dir] = {"tag": tag_name, "success": True, "error": None}
+            else:
+                # fast-import is all-or-nothing; fall back to one git tag per model
+                for model_dir, tag_name, message in pending:
+                    tagged = git("tag", "-a", tag_name, "-m", message.strip(), head.stdout.strip())
+                    error = tagged.stderr.strip() if tagged.returncode != 0 else None
+                    results[model_dir] = {"tag": tag_name, "success": error is None, "error": error}
+        
+        return {model_dir: results[model_dir] for model_dir in model_dirs}
+
+class VersionIndex:
+    """
+    Index of model versions across a directory tree.
+    
+    Maps each model name to its versions in sorted order, so "highest
+    v1.x" or "all versions between A and B" are answered with a binary
+    search instead of opening every metadata.json. The scan state is
+    saved outside the tree (under ~/.cache/ml_versioning by default, so
+    saving it never changes a directory mtime and read-only trees work);
+    refresh() only re-lists directories whose mtime changed and only
+    re-reads metadata files whose mtime changed.
+    """
+    
+    def __init__(self, root_dir, index_file=None):
+        """Load the saved index (if any) and bring it up to date."""
+        self.root_dir = os.path.normpath(root_dir)
+        self.index_file = index_file or self.default_index_file(self.root_dir)
+        self.state = {"dirs": {}, "models": {}}
+        
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError):
+                pass
+        
+        self.refresh()
+    
+    @staticmethod
+    def default_index_file(root_dir):
+        """Return the cache file used for a tree when no index_file is given."""
+        cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        digest = hashlib.sha256(os.path.abspath(root_dir).encode()).hexdigest()[:16]
+        return os.path.join(cache_dir, "ml_versioning", f"version_index-{digest}.json")
+    
+    def refresh(self):
+        """Bring the index up to date with the directory tree."""
+        dirs = self.state["dirs"]
+        models = self.state["models"]
+        seen_dirs = set()
+        seen_models = set()
+        changed = False
+        
+        stack = [self.root_dir]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            seen_dirs.add(dir_path)
+            
+            # Only re-list a directory when its entries may have changed
+            known = dirs.get(dir_path)
+            if known is None or known["mtime_ns"] != mtime_ns:
+                subdirs = []
+                has_metadata = False
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.name == "metadata.json":
+                            has_metadata = True
+                known = {"mtime_ns": mtime_ns, "subdirs": sorted(subdirs), "has_metadata": has_metadata}
+                dirs[dir_path] = known
+                changed = True
+            
+            if known["has_metadata"]:
+                seen_models.add(dir_path)
+                changed = self._refresh_model(dir_path) or changed
+            
+            stack.extend(known["subdirs"])
+        
+        for dir_path in set(dirs) - seen_dirs:
+            del dirs[dir_path]
+            changed = True
+        for model_dir in set(models) - seen_models:
+            del models[model_dir]
+            changed = True
+        
+        self._build()
+        if changed:
+            try:
+                os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+                MLVersioning.write_metadata(self.index_file, self.state)
+            except OSError as e:
+                # The index still works in memory; it is just rebuilt next time
+                print(f"Could not save version index {self.index_file}: {e}")
+    
+    def _refresh_model(self, model_dir):
+        """Re-read a model's metadata.json if it changed; return True if it did."""
+        metadata_file = os.path.join(model_dir, "metadata.json")
+        try:
+            mtime_ns = os.stat(metadata_file).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        
+        known = self.state["models"].get(model_dir)
+        if known is not None and known["mtime_ns"] == mtime_ns:
+            return False
+        
+        try:
+            with open(metadata_file, 'r') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            metadata = {}
+        
+        # Name from metadata, else the directory (or its parent for models/<name>/<version>)
+        name = metadata.get("name")
+        if not name:
+            name = os.path.basename(model_dir)
+            if re.match(r'^v?\d+\.\d+\.\d+$', name):
+                name = os.path.basename(os.path.dirname(model_dir))
+        
+        self.state["models"][model_dir] = {
+            "mtime_ns": mtime_ns,
+            "name": name,
+            "version": metadata.get("version")
+        }
+        return True
+    
+    def _build(self):
+        """Build the sorted per-model version lists."""
+        self.versions = {}
+        for model_dir, model in self.state["models"].items():
+            try:
+                key = MLVersioning.parse_version(model["version"] or "")
+            except ValueError:
+                continue
+            self.versions.setdefault(model["name"], []).append(key + (model["version"], model_dir))
+        
+        for entries in self.versions.values():
+            entries.sort()
+    
+    def models(self):
+        """Return the sorted model names."""
+        return sorted(self.versions)
+    
+    def latest(self, name, prefix=None):
+        """
+        Find the highest version of a model, optionally within a prefix.
+        
+        Args:
+            name (str): Model name
+            prefix (str, optional): "v1" for the highest v1.x, "v1.2" for
+                the highest v1.2.x
+            
+        Returns:
+            dict or None: {"version": str, "model_dir": str}
+            
+        Raises:
+            ValueError: If the prefix is not like "v1", "v1.2" or "v1.2.3"
+        """
+        entries = self.versions.get(name, [])
+        
+        if prefix is None:
+            index = len(entries)
+        else:
+            if not re.fullmatch(r'v?\d+(\.\d+){0,2}', prefix):
+                raise ValueError(f"Invalid version prefix: {prefix}")
+            parts = tuple(int(part) for part in prefix.lstrip("v").split("."))
+            upper = parts[:-1] + (parts[-1] + 1,)
+            index = bisect.bisect_left(entries, upper)
+            if index == 0 or entries[index - 1][:len(parts)] != parts:
+                return None
+        
+        if index == 0:
+            return None
+        
+        *_, version, model_dir = entries[index - 1]
+        return {"version": version, "model_dir": model_dir}
+    
+    def between(self, name, low, high):
+        """
+        List the versions of a model between two versions (inclusive).
+        
+        Args:
+            name (str): Model name
+            low (str): Lowest version, e.g. "v1.0.0"
+            high (str): Highest version, e.g. "v1.9.9"
+            
+        Returns:
+            list: {"version": str, "model_dir": str} dicts in ascending order
+        """
+        entries = self.versions.get(name, [])
+        major, minor, patch = MLVersioning.parse_version(high)
+        start = bisect.bisect_left(entries, MLVersioning.parse_version(low))
+        end = bisect.bisect_left(entries, (major, minor, patch + 1))
+        
+        return [{"version": version, "model_dir": model_dir}
+                for *_, version, model_dir in entries[start:end]]
 
 def main():
     """Main function for the versioning utility."""
@@ -166,6 +544,31 @@ def main():
     tag_parser.add_argument("--model-dir", required=True, help="Model directory")
     tag_parser.add_argument("--version", help="Version string (read from metadata if not provided)")
     
+    # Batch increment command
+    batch_increment_parser = subparsers.add_parser("batch-increment",
+                                                   help="Increment the version of every model under a directory")
+    batch_increment_parser.add_argument("--root", required=True, help="Directory containing model directories")
+    batch_increment_parser.add_argument("--level", choices=["major", "minor", "patch"],
+                                        default="patch", help="Version level to increment")
+    batch_increment_parser.add_argument("--metadata", help="Additional metadata as JSON string")
+    
+    # Batch tag command
+    batch_tag_parser = subparsers.add_parser("batch-tag", help="Create git tags for every model under a directory")
+    batch_tag_parser.add_argument("--root", required=True, help="Directory containing model directories")
+    
+    # Resolve command
+    resolve_parser = subparsers.add_parser("resolve", help="Find the highest version of a model")
+    resolve_parser.add_argument("--root", required=True, help="Directory containing model directories")
+    resolve_parser.add_argument("--name", required=True, help="Model name")
+    resolve_parser.add_argument("--prefix", help="Version prefix, e.g. v1 or v1.2")
+    
+    # Versions command
+    versions_parser = subparsers.add_parser("versions", help="List versions of a model in a range")
+    versions_parser.add_argument("--root", required=True, help="Directory containing model directories")
+    versions_parser.add_argument("--name", required=True, help="Model name")
+    versions_parser.add_argument("--min", default="v0.0.0", help="Lowest version (inclusive)")
+    versions_parser.add_argument("--max", default=f"v{2**31}.0.0", help="Highest version (inclusive)")
+    
     # Parse arguments
     args = parser.parse_args()
     
@@ -178,6 +581,48 @@ def main():
     elif args.command == "tag":
         MLVersioning.tag_model_version(args.model_dir, args.version)
     
+    elif args.command in ("batch-increment", "batch-tag"):
+        model_dirs = MLVersioning.find_model_dirs(args.root)
+        failures = 0
+        
+        if args.command == "batch-increment":
+            metadata = json.loads(args.metadata) if args.metadata else None
+            for model_dir, result in MLVersioning.batch_update_versions(model_dirs, args.level, metadata).items():
+                if "error" in result:
+                    failures += 1
+                    print(f"FAILED  {model_dir}: {result['error']}")
+                else:
+                    print(f"OK      {model_dir}: {result['version']}")
+            print("Commit the updated metadata.json files, then run batch-tag to tag the new versions")
+        
+        if args.command == "batch-tag":
+            for model_dir, result in MLVersioning.batch_tag_versions(model_dirs).items():
+                if result["success"]:
+                    print(f"TAGGED  {model_dir}: {result['tag']}")
+                else:
+                    failures += 1
+                    print(f"FAILED  {model_dir}: {result['error']}")
+        
+        print(f"{len(model_dirs)} model(s), {failures} failure(s)")
+    
+    elif args.command == "resolve":
+        try:
+            match = VersionIndex(args.root).latest(args.name, args.prefix)
+        except ValueError as e:
+            parser.error(str(e))
+        if match:
+            print(f"{match['version']}\t{match['model_dir']}")
+        else:
+            print(f"No matching version of {args.name}")
+    
+    elif args.command == "versions":
+        try:
+            matches = VersionIndex(args.root).between(args.name, args.min, args.max)
+        except ValueError as e:
+            parser.error(str(e))
+        for match in matches:
+            print(f"{match['version']}\t{match['model_dir']}")
+    
     else:
         parser.print_help()
 
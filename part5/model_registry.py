@@ -5,49 +5,303 @@ Model registry system for AI projects.
 """
 
 import os
+import re
+import sys
 import json
+import uuid
+import fcntl
+import mmap
 import shutil
+import sqlite3
 import hashlib
 import datetime
 import argparse
+import contextlib
+import concurrent.futures
 from typing import Dict, List, Optional, Any
 
+# Linux ioctl request number for FICLONE (copy-on-write clone of a file)
+FICLONE = 0x40049409
+
+# Metadata keys usable in queries and indexes (e.g. "accuracy", "training.dataset")
+METADATA_KEY_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+# Comparison operators accepted by query(); "~" is a substring match
+QUERY_OPERATORS = {"=": "=", "!=": "!=", ">": ">", ">=": ">=", "<": "<", "<=": "<=", "~": "LIKE"}
+
+# Datasets larger than this are stored as fixed-size, deduplicated chunks
+LARGE_DATASET_BYTES = 1_000_000_000
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Hashing: files above MMAP_THRESHOLD are memory-mapped, smaller ones are
+# read with a large buffer; either way data is fed to SHA-256 in big slices
+HASH_BUFFER_SIZE = 8 * 1024 * 1024
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+class Checkout:
+    """
+    Read-only view of a registered version, backed directly by its blobs.
+    
+    Nothing is copied: path is the version directory inside the registry,
+    whose files are hardlinks to the object store. Each file's integrity
+    is checked against the manifest the first time it is accessed.
+    
+    Files of chunked datasets are not materialized under path; file_path()
+    and open() reassemble them once into the registry's cache/ directory.
+    """
+    
+    def __init__(self, registry, kind: str, name: str, version: str, path: str, files: List[Dict]):
+        """Initialize the checkout (use ModelRegistry.checkout instead)."""
+        self.registry = registry
+        self.kind = kind
+        self.name = name
+        self.version = version
+        self.path = path
+        self.files = {entry["path"]: entry for entry in files}
+        self.verified = set()
+    
+    def file_path(self, rel_path: str) -> str:
+        """
+        Return the path of a file in the checkout, verifying it on first use.
+        
+        Args:
+            rel_path (str): Path relative to the version directory
+            
+        Returns:
+            str: Absolute path of the read-only file
+        """
+        if rel_path not in self.files:
+            raise FileNotFoundError(f"{rel_path} is not part of {self.name} {self.version}")
+        
+        entry = self.files[rel_path]
+        if "chunks" in entry:
+            full_path = self.registry._assemble(entry)
+        else:
+            full_path = os.path.abspath(os.path.join(self.path, *rel_path.split("/")))
+        if rel_path not in self.verified:
+            self.registry._verify_file(full_path, self.files[rel_path]["hash"])
+            self.verified.add(rel_path)
+        
+        return full_path
+    
+    def open(self, rel_path: str):
+        """
+        Memory-map a file in the checkout.
+        
+        Args:
+            rel_path (str): Path relative to the version directory
+            
+        Returns:
+            mmap.mmap or bytes: Read-only mapping (b"" for empty files)
+        """
+        full_path = self.file_path(rel_path)
+        if self.files[rel_path]["size"] == 0:
+            return b""
+        with open(full_path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def verify_all(self):
+        """Verify every file in the checkout now instead of lazily."""
+        for rel_path in self.files:
+            self.file_path(rel_path)
+
 class ModelRegistry:
     """
     Model registry for versioning and tracking ML models.
     
     This class provides functionality to register, version, and
     track machine learning models and their associated metadata.
+    
+    File contents are kept in a content-addressed object store
+    (objects/<hash[:2]>/<hash[2:]>), so identical files are stored once
+    no matter how many versions reference them. Each version has a
+    manifest listing its files and their hashes, and its directory under
+    models/ or datasets/ is materialized with hardlinks to the blobs.
+    
+    The index of models, datasets and versions lives in an SQLite
+    database (registry.db), so each registration is a single small
+    transaction and lookups go through indexes.
+    
+    Registrations are safe to run from several processes at once: files
+    are copied into a private staging directory under tmp/, and only the
+    final publish step (rename into place, manifest, index row) runs
+    under an exclusive file lock.
     """
     
-    def __init__(self, registry_path: str = "model_registry"):
+    def __init__(self, registry_path: str = "model_registry", hash_workers: int = None):
         """Initialize the model registry."""
         self.registry_path = registry_path
+        self.hash_workers = hash_workers or os.cpu_count() or 4
+        self._checkouts = {}
         self.index_file = os.path.join(registry_path, "registry_index.json")
+        self.objects_path = os.path.join(registry_path, "objects")
+        self.manifests_path = os.path.join(registry_path, "manifests")
+        self.tmp_path = os.path.join(registry_path, "tmp")
+        self.locks_path = os.path.join(registry_path, "locks")
+        self.cache_path = os.path.join(registry_path, "cache")
         
-        # Create registry directory if it doesn't exist
-        os.makedirs(registry_path, exist_ok=True)
+        # Create registry directories if they don't exist
+        for path in (registry_path, self.objects_path, self.manifests_path,
+                     self.tmp_path, self.locks_path, self.cache_path):
+            os.makedirs(path, exist_ok=True)
         
-        # Initialize or load the registry index
+        # Open the registry index database
+        self.db_file = os.path.join(registry_path, "registry.db")
+        # Callers may share a registry across threads if they serialize access
+        self.db = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self._init_db()
+        
+        # One-shot migration from the old JSON index
         if os.path.exists(self.index_file):
-            with open(self.index_file, 'r') as f:
-                self.registry_index = json.load(f)
+            with self._file_lock("commit"):
+                if os.path.exists(self.index_file):
+                    self._migrate_json_index()
+    
+    @contextlib.contextmanager
+    def _file_lock(self, name: str, shared: bool = False):
+        """
+        Hold a cross-process lock on locks/<name>.lock.
+        
+        Args:
+            name (str): Lock name
+            shared (bool): Take a shared lock instead of an exclusive one
+        """
+        with open(os.path.join(self.locks_path, f"{name}.lock"), 'a') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    
+    def _init_db(self):
+        """Create the index tables if they don't exist."""
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.db:
+            for kind in ("models", "datasets"):
+                self.db.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {kind} (
+                        name TEXT PRIMARY KEY,
+                        created TEXT NOT NULL,
+                        latest_version TEXT
+                    )""")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS versions (
+                    kind TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    registered_at TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    PRIMARY KEY (kind, name, version)
+                )""")
+            self.db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_versions_registered
+                ON versions (kind, name, registered_at)""")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS tags (
+                    kind TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    tag TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    PRIMARY KEY (kind, name, tag)
+                )""")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS hash_cache (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    hash TEXT NOT NULL
+                )""")
+    
+    def _migrate_json_index(self):
+        """Import registry_index.json into the database and retire the file."""
+        with open(self.index_file, 'r') as f:
+            registry_index = json.load(f)
+        
+        with self.db:
+            for kind in ("models", "datasets"):
+                for name, entry in registry_index.get(kind, {}).items():
+                    self.db.execute(
+                        f"INSERT OR IGNORE INTO {kind} (name, created, latest_version) VALUES (?, ?, ?)",
+                        (name, entry["created"], entry["latest_version"]))
+                    for version, metadata in entry["versions"].items():
+                        self.db.execute(
+                            "INSERT OR IGNORE INTO versions (kind, name, version, registered_at, metadata) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            (kind, name, version, metadata.get("registered_at", entry["created"]),
+                             json.dumps(metadata)))
+        
+        os.replace(self.index_file, self.index_file + ".migrated")
+        print(f"Migrated {self.index_file} to {self.db_file}")
+    
+    def _record_version(self, kind: str, name: str, version: str, metadata: Dict):
+        """
+        Add a version to the index and make it the latest, in one transaction.
+        
+        Args:
+            kind (str): "models" or "datasets"
+            name (str): Model or dataset name
+            version (str): Version string
+            metadata (dict): Version metadata
+        """
+        with self.db:
+            self.db.execute(
+                f"INSERT OR IGNORE INTO {kind} (name, created) VALUES (?, ?)",
+                (name, metadata["registered_at"]))
+            self.db.execute(
+                "INSERT OR REPLACE INTO versions (kind, name, version, registered_at, metadata) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (kind, name, version, metadata["registered_at"], json.dumps(metadata)))
+            self.db.execute(
+                f"UPDATE {kind} SET latest_version = ? WHERE name = ?",
+                (version, name))
+    
+    def _lookup_version(self, kind: str, name: str, version: str = "latest") -> Optional[Dict]:
+        """
+        Fetch the metadata of a version from the index.
+        
+        Args:
+            kind (str): "models" or "datasets"
+            name (str): Model or dataset name
+            version (str): Version string, tag, or "latest"
+            
+        Returns:
+            dict or None: Version metadata with "name" and "version" added
+        """
+        tagged = self.db.execute(
+            "SELECT version FROM tags WHERE kind = ? AND name = ? AND tag = ?",
+            (kind, name, version)).fetchone()
+        if tagged is not None:
+            version = tagged["version"]
+        
+        if version == "latest":
+            row = self.db.execute(
+                f"SELECT v.version, v.metadata FROM {kind} e JOIN versions v "
+                "ON v.kind = ? AND v.name = e.name AND v.version = e.latest_version "
+                "WHERE e.name = ?", (kind, name)).fetchone()
         else:
-            self.registry_index = {
-                "models": {},
-                "datasets": {},
-                "last_updated": datetime.datetime.now().isoformat()
-            }
-            self._save_index()
+            row = self.db.execute(
+                "SELECT version, metadata FROM versions WHERE kind = ? AND name = ? AND version = ?",
+                (kind, name, version)).fetchone()
+        
+        if row is None:
+            return None
+        
+        info = json.loads(row["metadata"])
+        info["name"] = name
+        info["version"] = row["version"]
+        return info
     
-    def _save_index(self):
-        """Save the registry index to disk."""
-        self.registry_index["last_updated"] = datetime.datetime.now().isoformat()
-        with open(self.index_file, 'w') as f:
-            json.dump(self.registry_index, f, indent=2)
+    def _exists(self, kind: str, name: str) -> bool:
+        """Check whether a model or dataset name is registered."""
+        return self.db.execute(
+            f"SELECT 1 FROM {kind} WHERE name = ?", (name,)).fetchone() is not None
     
     def register_model(self, model_name: str, model_path: str, 
-                       version: str = None, metadata: Dict = None) -> str:
+                       version: str = None, metadata: Dict = None,
+                       incremental: bool = False) -> str:
         """
         Register a model in the registry.
         
@@ -56,6 +310,8 @@ class ModelRegistry:
             model_path (str): Path to the model directory or file
             version (str, optional): Version string (auto-generated if None)
             metadata (dict, optional): Additional metadata
+            incremental (bool): Carry over files whose size and mtime match
+                the latest version's manifest instead of re-hashing them
             
         Returns:
             str: The model version
@@ -63,75 +319,74 @@ class ModelRegistry:
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model path does not exist: {model_path}")
         
-        # Generate version if not provided
-        if version is None:
-            version = self._generate_version()
-        
-        # Initialize model entry if it doesn't exist
-        if model_name not in self.registry_index["models"]:
-            self.registry_index["models"][model_name] = {
-                "versions": {},
-                "latest_version": None,
-                "created": datetime.datetime.now().isoformat()
-            }
-        
-        # Create model directory in registry
-        model_dir = os.path.join(self.registry_path, "models", model_name, version)
-        os.makedirs(model_dir, exist_ok=True)
-        
-        # Copy model files
-        if os.path.isdir(model_path):
-            # Copy directory contents
-            for item in os.listdir(model_path):
-                s = os.path.join(model_path, item)
-                d = os.path.join(model_dir, item)
-                if os.path.isdir(s):
-                    shutil.copytree(s, d, dirs_exist_ok=True)
-                else:
-                    shutil.copy2(s, d)
-        else:
-            # Copy single file
-            shutil.copy2(model_path, model_dir)
-        
-        # Prepare metadata
-        if metadata is None:
-            metadata = {}
-        
-        # Add standard metadata
-        metadata.update({
-            "registered_at": datetime.datetime.now().isoformat(),
-            "original_path": model_path,
-            "registry_path": model_dir
-        })
-        
-        # Calculate model size and file hash
-        if os.path.isdir(model_path):
-            total_size = sum(os.path.getsize(os.path.join(dirpath, filename))
-                             for dirpath, _, filenames in os.walk(model_path)
-                             for filename in filenames)
-            metadata["model_size_bytes"] = total_size
-        else:
-            metadata["model_size_bytes"] = os.path.getsize(model_path)
-            metadata["file_hash"] = self._calculate_file_hash(model_path)
-        
-        # Update registry index
-        self.registry_index["models"][model_name]["versions"][version] = metadata
-        self.registry_index["models"][model_name]["latest_version"] = version
-        self._save_index()
+        # Hold the GC lock (shared) so garbage collection never sweeps blobs
+        # this registration is still writing
+        with self._file_lock("gc", shared=True):
+            # Compare against the previous version's manifest in incremental mode
+            previous = self._previous_files("models", model_name) if incremental else None
+            
+            # Store model files as blobs and materialize them in a staging directory
+            files, new_bytes = self._ingest_files(self._scan_path(model_path), previous)
+            staging_dir = self._new_staging_dir()
+            self._materialize(files, staging_dir)
+            
+            # Chunked files are not materialized, so leave a note where they used to be
+            if chunked:
+                with open(os.path.join(staging_dir, "dataset_reference.txt"), 'w') as f:
+                    f.write(f"Original dataset path: {os.path.abspath(dataset_path)}\n")
+                    f.write(f"Dataset size: {total_size / (1024**2):.2f} MB\n")
+                    f.write(f"Stored as deduplicated chunks; read the files through "
+                            f"ModelRegistry.checkout({dataset_name!r}, version, kind=\"datasets\")\n")
+            
+            # Prepare metadata
+            if metadata is None:
+                metadata = {}
+            
+            # Add standard metadata
+            metadata.update({
+                "registered_at": datetime.datetime.now().isoformat(),
+                "original_path": model_path,
+                "model_size_bytes": sum(entry["size"] for entry in files),
+                "file_count": len(files),
+                "stored_bytes": new_bytes,
+                "reused_bytes": sum(entry["size"] for entry in files) - new_bytes
+            })
+            
+            if os.path.isdir(model_path):
+                metadata["directory_hash"] = self._directory_digest(files)
+            else:
+                metadata["file_hash"] = files[0]["hash"]
+            
+            # Publish the version and update the registry index
+            version = self._commit_version("models", model_name, version, staging_dir, files, metadata)
         
         print(f"Model {model_name} version {version} registered successfully.")
+        if incremental:
+            print(f"Copied {metadata['stored_bytes']:,} bytes, "
+                  f"skipped {metadata['reused_bytes']:,} bytes already in the registry.")
         return version
     
     def register_dataset(self, dataset_name: str, dataset_path: str,
-                         version: str = None, metadata: Dict = None) -> str:
+                         version: str = None, metadata: Dict = None,
+                         incremental: bool = False, chunked: bool = None) -> str:
         """
         Register a dataset in the registry.
         
+        Datasets over 1GB are streamed into fixed-size chunks that are
+        deduplicated across versions, so a new version of a mostly
+        appended dataset only stores its new chunks. Their files are not
+        placed under registry_path (which only holds dataset_reference.txt);
+        metadata["access"] is "checkout" and they are read through checkout().
+        
         Args:
             dataset_name (str): Name of the dataset
             dataset_path (str): Path to the dataset directory or file
             version (str, optional): Version string (auto-generated if None)
             metadata (dict, optional): Additional metadata
+            incremental (bool): Carry over files whose size and mtime match
+                the latest version's manifest instead of re-reading them
+            chunked (bool, optional): Force chunked storage on or off
+                (default: chunk datasets over 1GB)
             
         Returns:
             str: The dataset version
@@ -139,75 +394,67 @@ class ModelRegistry:
         if not os.path.exists(dataset_path):
             raise FileNotFoundError(f"Dataset path does not exist: {dataset_path}")
         
-        # Generate version if not provided
-        if version is None:
-            version = self._generate_version()
-        
-        # Initialize dataset entry if it doesn't exist
-        if dataset_name not in self.registry_index["datasets"]:
-            self.registry_index["datasets"][dataset_name] = {
-                "versions": {},
-                "latest_version": None,
-                "created": datetime.datetime.now().isoformat()
-            }
-        
-        # Create dataset directory in registry
-        dataset_dir = os.path.join(self.registry_path, "datasets", dataset_name, version)
-        os.makedirs(dataset_dir, exist_ok=True)
-        
-        # Copy dataset files (or reference)
-        is_large_dataset = False
-        if os.path.isdir(dataset_path):
+        # Hold the GC lock (shared) so garbage collection never sweeps blobs
+        # this registration is still writing
+        with self._file_lock("gc", shared=True):
             # Check dataset size
-            total_size = sum(os.path.getsize(os.path.join(dirpath, filename))
-                             for dirpath, _, filenames in os.walk(dataset_path)
-                             for filename in filenames)
-            
-            # If dataset is larger than 1GB, just store reference
-            if total_size > 1_000_000_000:  # 1GB
-                is_large_dataset = True
-                with open(os.path.join(dataset_dir, "dataset_reference.txt"), 'w') as f:
+            sources = self._scan_path(dataset_path)
+            total_size = sum(stat.st_size for _, _, stat in sources)
+            
+            # Stream large datasets into chunks instead of whole-file blobs
+            if chunked is None:
+                chunked = total_size > LARGE_DATASET_BYTES
+            chunk_size = CHUNK_SIZE if chunked else None
+            
+            # Compare against the previous version's manifest in incremental mode
+            previous = self._previous_files("datasets", dataset_name) if incremental else None
+            
+            # Store dataset files as blobs and materialize them in a staging directory
+            files, new_bytes = self._ingest_files(sources, previous, chunk_size)
+            staging_dir = self._new_staging_dir()
+            self._materialize(files, staging_dir)
+            
+            # Chunked files are not materialized, so leave a note where they used to be
+            if chunked:
+                with open(os.path.join(staging_dir, "dataset_reference.txt"), 'w') as f:
                     f.write(f"Original dataset path: {os.path.abspath(dataset_path)}\n")
                     f.write(f"Dataset size: {total_size / (1024**2):.2f} MB\n")
-            else:
-                # Copy directory contents
-                for item in os.listdir(dataset_path):
-                    s = os.path.join(dataset_path, item)
-                    d = os.path.join(dataset_dir, item)
-                    if os.path.isdir(s):
-                        shutil.copytree(s, d, dirs_exist_ok=True)
-                    else:
-                        shutil.copy2(s, d)
-        else:
-            # Copy single file
-            shutil.copy2(dataset_path, dataset_dir)
-        
-        # Prepare metadata
-        if metadata is None:
-            metadata = {}
-        
-        # Add standard metadata
-        metadata.update({
-            "registered_at": datetime.datetime.now().isoformat(),
-            "original_path": dataset_path,
-            "registry_path": dataset_dir,
-            "is_reference_only": is_large_dataset
-        })
-        
-        # Calculate dataset statistics
-        if not is_large_dataset:
+                    f.write(f"Stored as deduplicated chunks; read the files through "
+                            f"ModelRegistry.checkout({dataset_name!r}, version, kind=\"datasets\")\n")
+            
+            # Prepare metadata
+            if metadata is None:
+                metadata = {}
+            
+            # Add standard metadata
+            metadata.update({
+                "registered_at": datetime.datetime.now().isoformat(),
+                "original_path": dataset_path,
+                "is_reference_only": False,
+                "is_chunked": chunked,
+                # "checkout": files are only readable through checkout(), not registry_path
+                "access": "checkout" if chunked else "path"
+            })
+            
+            # Calculate dataset statistics
+            metadata["dataset_size_bytes"] = total_size
+            metadata["file_count"] = len(files)
+            metadata["stored_bytes"] = new_bytes
+            metadata["reused_bytes"] = total_size - new_bytes
+            if chunked:
+                metadata["chunk_size"] = chunk_size
             if os.path.isdir(dataset_path):
-                metadata["dataset_size_bytes"] = total_size
+                metadata["directory_hash"] = self._directory_digest(files)
             else:
-                metadata["dataset_size_bytes"] = os.path.getsize(dataset_path)
-                metadata["file_hash"] = self._calculate_file_hash(dataset_path)
-        
-        # Update registry index
-        self.registry_index["datasets"][dataset_name]["versions"][version] = metadata
-        self.registry_index["datasets"][dataset_name]["latest_version"] = version
-        self._save_index()
+                metadata["file_hash"] = files[0]["hash"]
+            
+            # Publish the version and update the registry index
+            version = self._commit_version("datasets", dataset_name, version, staging_dir, files, metadata)
         
         print(f"Dataset {dataset_name} version {version} registered successfully.")
+        if incremental or chunked:
+            print(f"Copied {metadata['stored_bytes']:,} bytes, "
+                  f"skipped {metadata['reused_bytes']:,} bytes already in the registry.")
         return version
     
     def get_model(self, model_name: str, version: str = "latest") -> Optional[Dict]:
@@ -221,21 +468,15 @@ class ModelRegistry:
         Returns:
             dict or None: Model information
         """
-        if model_name not in self.registry_index["models"]:
+        if not self._exists("models", model_name):
             print(f"Model {model_name} not found in registry.")
             return None
         
-        if version == "latest":
-            version = self.registry_index["models"][model_name]["latest_version"]
-        
-        if version not in self.registry_index["models"][model_name]["versions"]:
+        model_info = self._lookup_version("models", model_name, version)
+        if model_info is None:
             print(f"Version {version} of model {model_name} not found.")
             return None
         
-        model_info = self.registry_index["models"][model_name]["versions"][version].copy()
-        model_info["name"] = model_name
-        model_info["version"] = version
-        
         return model_info
     
     def get_dataset(self, dataset_name: str, version: str = "latest") -> Optional[Dict]:
@@ -249,21 +490,15 @@ class ModelRegistry:
         Returns:
             dict or None: Dataset information
         """
-        if dataset_name not in self.registry_index["datasets"]:
+        if not self._exists("datasets", dataset_name):
             print(f"Dataset {dataset_name} not found in registry.")
             return None
         
-        if version == "latest":
-            version = self.registry_index["datasets"][dataset_name]["latest_version"]
-        
-        if version not in self.registry_index["datasets"][dataset_name]["versions"]:
+        dataset_info = self._lookup_version("datasets", dataset_name, version)
+        if dataset_info is None:
             print(f"Version {version} of dataset {dataset_name} not found.")
             return None
         
-        dataset_info = self.registry_index["datasets"][dataset_name]["versions"][version].copy()
-        dataset_info["name"] = dataset_name
-        dataset_info["version"] = version
-        
         return dataset_info
     
     def list_models(self) -> List[Dict]:
@@ -275,11 +510,15 @@ class ModelRegistry:
         """
         models = []
         
-        for model_name, model_data in self.registry_index["models"].items():
-            latest_version = model_data["latest_version"]
-            if latest_version:
-                model_info = self.get_model(model_name, latest_version)
-                models.append(model_info)
+        rows = self.db.execute(
+            "SELECT v.name, v.version, v.metadata FROM models e JOIN versions v "
+            "ON v.kind = 'models' AND v.name = e.name AND v.version = e.latest_version "
+            "ORDER BY e.rowid")
+        for row in rows:
+            model_info = json.loads(row["metadata"])
+            model_info["name"] = row["name"]
+            model_info["version"] = row["version"]
+            models.append(model_info)
         
         return models
     
@@ -292,14 +531,848 @@ class ModelRegistry:
         """
         datasets = []
         
-        for dataset_name, dataset_data in self.registry_index["datasets"].items():
-            latest_version = dataset_data["latest_version"]
-            if latest_version:
-                dataset_info = self.get_dataset(dataset_name, latest_version)
-                datasets.append(dataset_info)
+        rows = self.db.execute(
+            "SELECT v.name, v.version, v.metadata FROM datasets e JOIN versions v "
+            "ON v.kind = 'datasets' AND v.name = e.name AND v.version = e.latest_version "
+            "ORDER BY e.rowid")
+        for row in rows:
+            dataset_info = json.loads(row["metadata"])
+            dataset_info["name"] = row["name"]
+            dataset_info["version"] = row["version"]
+            datasets.append(dataset_info)
         
         return datasets
     
+    def tag_version(self, kind: str, name: str, version: str, tag: str):
+        """
+        Point a tag (e.g. "production") at a version.
+        
+        Tagged versions can be fetched by tag and are kept by prune().
+        
+        Args:
+            kind (str): "models" or "datasets"
+            name (str): Model or dataset name
+            version (str): Version to tag
+            tag (str): Tag name (moved if it already exists)
+        """
+        if self._lookup_version(kind, name, version) is None:
+            raise ValueError(f"Version {version} of {name} not found.")
+        
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO tags (kind, name, tag, version) VALUES (?, ?, ?, ?)",
+                (kind, name, tag, version))
+    
+    def delete_version(self, kind: str, name: str, version: str):
+        """
+        Remove a version from the registry.
+        
+        The index row, tags, manifest and version directory are removed.
+        Blobs are left for gc() to reclaim once nothing references them.
+        
+        Args:
+            kind (str): "models" or "datasets"
+            name (str): Model or dataset name
+            version (str): Version to delete
+        """
+        with self._file_lock("commit"):
+            with self.db:
+                self.db.execute(
+                    "DELETE FROM versions WHERE kind = ? AND name = ? AND version = ?",
+                    (kind, name, version))
+                self.db.execute(
+                    "DELETE FROM tags WHERE kind = ? AND name = ? AND version = ?",
+                    (kind, name, version))
+                
+                # Point "latest" at the newest remaining version, or drop the entry
+                row = self.db.execute(
+                    "SELECT version FROM versions WHERE kind = ? AND name = ? "
+                    "ORDER BY registered_at DESC LIMIT 1", (kind, name)).fetchone()
+                if row is None:
+                    self.db.execute(f"DELETE FROM {kind} WHERE name = ?", (name,))
+                else:
+                    self.db.execute(
+                        f"UPDATE {kind} SET latest_version = ? WHERE name = ?",
+                        (row["version"], name))
+            
+            manifest_path = self._manifest_path(kind, name, version)
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            
+            version_dir = os.path.join(self.registry_path, kind, name, version)
+            old_dir = None
+            if os.path.exists(version_dir):
+                old_dir = os.path.join(self.tmp_path, f"old-{uuid.uuid4().hex}")
+                os.rename(version_dir, old_dir)
+            
+            # A cached checkout would hand out paths that no longer exist
+            self._checkouts.pop((kind, name, version), None)
+        
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    
+    def prune(self, kind: str = "models", name: str = None, keep_last: int = None,
+              keep_tagged: bool = True, newer_than_days: float = None,
+              dry_run: bool = False) -> List[tuple]:
+        """
+        Apply a retention policy and delete the versions it does not keep.
+        
+        A version is kept if any rule keeps it: it is the latest version,
+        it is among the newest keep_last versions, it is tagged (when
+        keep_tagged), or it was registered within newer_than_days.
+        
+        Args:
+            kind (str): "models" or "datasets"
+            name (str, optional): Only prune this model or dataset
+            keep_last (int, optional): Number of newest versions to keep
+            keep_tagged (bool): Keep versions that have a tag
+            newer_than_days (float, optional): Keep versions younger than this
+            dry_run (bool): Only report what would be deleted
+            
+        Returns:
+            list: (name, version) pairs deleted (or that would be)
+        """
+        if keep_last is None and newer_than_days is None:
+            raise ValueError("Specify keep_last and/or newer_than_days")
+        
+        cutoff = None
+        if newer_than_days is not None:
+            cutoff = (datetime.datetime.now() - datetime.timedelta(days=newer_than_days)).isoformat()
+        
+        names = [name] if name else [
+            row["name"] for row in self.db.execute(f"SELECT name FROM {kind}")]
+        
+        doomed = []
+        for entry_name in names:
+            latest = self.db.execute(
+                f"SELECT latest_version FROM {kind} WHERE name = ?", (entry_name,)).fetchone()
+            tagged = {row["version"] for row in self.db.execute(
+                "SELECT version FROM tags WHERE kind = ? AND name = ?", (kind, entry_name))}
+            rows = self.db.execute(
+                "SELECT version, registered_at FROM versions WHERE kind = ? AND name = ? "
+                "ORDER BY registered_at DESC", (kind, entry_name)).fetchall()
+            
+            for position, row in enumerate(rows):
+                keep = (
+                    (latest is not None and row["version"] == latest["latest_version"])
+                    or (keep_last is not None and position < keep_last)
+                    or (keep_tagged and row["version"] in tagged)
+                    or (cutoff is not None and row["registered_at"] >= cutoff)
+                )
+                if not keep:
+                    doomed.append((entry_name, row["version"]))
+        
+        if not dry_run:
+            for entry_name, version in doomed:
+                self.delete_version(kind, entry_name, version)
+        
+        return doomed
+    
+    def _iter_manifests(self):
+        """Yield (kind, name, version, manifest) for every indexed version with a manifest."""
+        rows = self.db.execute("SELECT kind, name, version FROM versions").fetchall()
+        for row in rows:
+            manifest = self._read_manifest(row["kind"], row["name"], row["version"])
+            if manifest is not None:
+                yield row["kind"], row["name"], row["version"], manifest
+    
+    def _manifest_blobs(self, manifest: Dict):
+        """Yield (hash, size) for every blob a manifest references."""
+        for entry in manifest["files"]:
+            yield from self._entry_blobs(entry)
+    
+    def _entry_blobs(self, entry: Dict):
+        """Yield (hash, size) for the blobs of one manifest entry (whole file or chunks)."""
+        if "chunks" not in entry:
+            yield entry["hash"], entry["size"]
+            return
+        
+        chunk_size = entry["chunk_size"]
+        for index, digest in enumerate(entry["chunks"]):
+            yield digest, min(chunk_size, entry["size"] - index * chunk_size)
+    
+    def gc(self, dry_run: bool = False) -> Dict:
+        """
+        Mark-and-sweep garbage collection of the object store.
+        
+        Marks every blob referenced by an indexed version's manifest and
+        deletes the rest, along with leftovers from interrupted
+        registrations in tmp/. Holds the GC lock exclusively, so it waits
+        for in-flight registrations and blocks new ones until done.
+        
+        Args:
+            dry_run (bool): Only report what would be freed
+            
+        Returns:
+            dict: Counts of blobs kept and removed, and bytes freed
+        """
+        with self._file_lock("gc"):
+            # Mark
+            live = set()
+            assembled = set()
+            for _, _, _, manifest in self._iter_manifests():
+                live.update(digest for digest, _ in self._manifest_blobs(manifest))
+                assembled.update(entry["hash"] for entry in manifest["files"] if "chunks" in entry)
+            
+            # Sweep
+            removed = 0
+            freed_bytes = 0
+            for prefix in os.listdir(self.objects_path):
+                prefix_dir = os.path.join(self.objects_path, prefix)
+                for blob_name in os.listdir(prefix_dir):
+                    if prefix + blob_name in live:
+                        continue
+                    blob_path = os.path.join(prefix_dir, blob_name)
+                    freed_bytes += os.path.getsize(blob_path)
+                    removed += 1
+                    if not dry_run:
+                        os.remove(blob_path)
+            
+            # Drop reassembled chunked files that no version references any more
+            for cached_name in os.listdir(self.cache_path):
+                if cached_name not in assembled:
+                    cached_path = os.path.join(self.cache_path, cached_name)
+                    freed_bytes += os.path.getsize(cached_path)
+                    if not dry_run:
+                        os.remove(cached_path)
+            
+            # No registration can be in flight, so everything in tmp/ is stale
+            if not dry_run:
+                for leftover in os.listdir(self.tmp_path):
+                    shutil.rmtree(os.path.join(self.tmp_path, leftover), ignore_errors=True)
+        
+        return {"blobs_kept": len(live), "blobs_removed": removed, "bytes_freed": freed_bytes}
+    
+    def space_report(self) -> Dict:
+        """
+        Report disk usage per model and dataset, like du.
+        
+        For each entry: logical_bytes is the sum of all its versions'
+        sizes, unique_bytes counts each blob it references once, and
+        exclusive_bytes counts blobs no other entry shares (what deleting
+        it entirely would free).
+        
+        Returns:
+            dict: Per-entry usage and store totals
+        """
+        blob_sizes = {}
+        owners = {}
+        entries = {}
+        for kind, name, _, manifest in self._iter_manifests():
+            usage = entries.setdefault((kind, name), {"versions": 0, "logical_bytes": 0, "blobs": set()})
+            usage["versions"] += 1
+            for digest, size in self._manifest_blobs(manifest):
+                usage["logical_bytes"] += size
+                usage["blobs"].add(digest)
+                blob_sizes[digest] = size
+                owners.setdefault(digest, set()).add((kind, name))
+        
+        report = {"models": {}, "datasets": {}}
+        for (kind, name), usage in sorted(entries.items()):
+            report[kind][name] = {
+                "versions": usage["versions"],
+                "logical_bytes": usage["logical_bytes"],
+                "unique_bytes": sum(blob_sizes[digest] for digest in usage["blobs"]),
+                "exclusive_bytes": sum(blob_sizes[digest] for digest in usage["blobs"]
+                                       if len(owners[digest]) == 1)
+            }
+        
+        store_bytes = sum(os.path.getsize(os.path.join(dirpath, filename))
+                          for dirpath, _, filenames in os.walk(self.objects_path)
+                          for filename in filenames)
+        report["store_bytes"] = store_bytes
+        report["referenced_bytes"] = sum(blob_sizes.values())
+        report["reclaimable_bytes"] = store_bytes - report["referenced_bytes"]
+        
+        return report
+    
+    def checkout(self, name: str, version: str = "latest", kind: str = "models") -> Checkout:
+        """
+        Get a zero-copy, read-only checkout of a registered version.
+        
+        Load weights straight from checkout.path (or checkout.open() for a
+        memory-mapped handle); no files are copied. Files are verified
+        against the manifest lazily on first access, and checkouts are
+        cached so repeated calls cost nothing.
+        
+        Args:
+            name (str): Model or dataset name
+            version (str): Version, tag, or "latest"
+            kind (str): "models" or "datasets"
+            
+        Returns:
+            Checkout: The checkout
+        """
+        info = self._lookup_version(kind, name, version)
+        if info is None:
+            raise ValueError(f"Version {version} of {name} not found.")
+        
+        key = (kind, name, info["version"])
+        if key not in self._checkouts:
+            manifest = self._read_manifest(kind, name, info["version"])
+            if manifest is None:
+                raise ValueError(f"{name} {info['version']} has no manifest (reference-only).")
+            self._checkouts[key] = Checkout(self, kind, name, info["version"],
+                                            os.path.abspath(info["registry_path"]), manifest["files"])
+        
+        return self._checkouts[key]
+    
+    def _verify_file(self, full_path: str, expected_hash: str):
+        """
+        Check a stored file against its manifest hash.
+        
+        The file is always re-hashed (never taken from the hash cache, whose
+        size/mtime/inode key would not catch bit rot); Checkout.verified
+        remembers successful checks for the life of the checkout only.
+        """
+        digest = self._calculate_file_hash(full_path)
+        if digest != expected_hash:
+            raise IOError(f"Integrity check failed for {full_path}: "
+                          f"expected {expected_hash}, got {digest}")
+    
+    def _metadata_column(self, key: str) -> str:
+        """
+        Return the SQL expression for a metadata key.
+        
+        name, version and registered_at map to real columns; anything else
+        is extracted from the JSON metadata. The JSON path is inlined (not
+        bound as a parameter) so it matches expression indexes exactly.
+        """
+        if key in ("name", "version", "registered_at"):
+            return key
+        if not METADATA_KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid metadata key: {key}")
+        return f"json_extract(metadata, '$.{key}')"
+    
+    def create_index(self, key: str):
+        """
+        Add a secondary index on a metadata key.
+        
+        Queries that filter or sort on the key then use the index instead
+        of scanning every version.
+        
+        Args:
+            key (str): Metadata key, dotted for nested values
+        """
+        column = self._metadata_column(key)
+        index_name = "idx_meta_" + key.replace(".", "__")
+        with self.db:
+            self.db.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON versions (kind, {column})")
+    
+    def list_indexes(self) -> List[str]:
+        """Return the metadata keys that have a secondary index."""
+        rows = self.db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_meta_%'")
+        return [row["name"][len("idx_meta_"):].replace("__", ".") for row in rows]
+    
+    def query(self, kind: str = "models", filters: List[tuple] = None, name: str = None,
+              sort_by: str = None, descending: bool = False,
+              limit: int = None, offset: int = 0) -> List[Dict]:
+        """
+        Find versions whose metadata matches all filters.
+        
+        Example: all model versions with accuracy above 0.9 trained on
+        dataset X, best first:
+        
+            registry.query("models", [("accuracy", ">", 0.9), ("dataset", "=", "X")],
+                           sort_by="accuracy", descending=True)
+        
+        Args:
+            kind (str): "models" or "datasets"
+            filters (list, optional): (key, operator, value) tuples; operators
+                are =, !=, >, >=, <, <= and ~ (substring)
+            name (str, optional): Only versions of this model or dataset
+            sort_by (str, optional): Key to sort by (default: registration time)
+            descending (bool): Sort in descending order
+            limit (int, optional): Maximum number of results
+            offset (int): Number of results to skip
+            
+        Returns:
+            list: Version information dictionaries, like get_model()
+        """
+        conditions = ["kind = ?"]
+        params = [kind]
+        
+        if name is not None:
+            conditions.append("name = ?")
+            params.append(name)
+        
+        for key, operator, value in filters or []:
+            if operator not in QUERY_OPERATORS:
+                raise ValueError(f"Invalid operator: {operator}")
+            conditions.append(f"{self._metadata_column(key)} {QUERY_OPERATORS[operator]} ?")
+            params.append(f"%{value}%" if operator == "~" else value)
+        
+        sql = (f"SELECT name, version, metadata FROM versions WHERE {' AND '.join(conditions)} "
+               f"ORDER BY {self._metadata_column(sort_by or 'registered_at')} "
+               f"{'DESC' if descending else 'ASC'}")
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit if limit is not None else -1, offset])
+        
+        results = []
+        for row in self.db.execute(sql, params):
+            info = json.loads(row["metadata"])
+            info["name"] = row["name"]
+            info["version"] = row["version"]
+            results.append(info)
+        
+        return results
+    
+    def _new_staging_dir(self) -> str:
+        """Create a private staging directory for a registration in progress."""
+        staging_dir = os.path.join(self.tmp_path, f"stage-{uuid.uuid4().hex}")
+        os.makedirs(staging_dir)
+        return staging_dir
+    
+    def _commit_version(self, kind: str, name: str, version: Optional[str],
+                        staging_dir: str, files: Optional[List[Dict]], metadata: Dict) -> str:
+        """
+        Atomically publish a staged version.
+        
+        Under the commit lock, the staging directory is renamed into place,
+        the manifest is written, and the index row is recorded, so readers
+        never see a half-copied version and concurrent writers never lose
+        each other's registrations.
+        
+        Args:
+            kind (str): "models" or "datasets"
+            name (str): Model or dataset name
+            version (str or None): Version string (auto-generated if None)
+            staging_dir (str): Fully populated staging directory
+            files (list or None): Manifest file entries (None for references)
+            metadata (dict): Version metadata
+            
+        Returns:
+            str: The published version
+        """
+        with self._file_lock("commit"):
+            # Auto-generated versions must not collide with a concurrent registration
+            if version is None:
+                base_version = version = self._generate_version()
+                suffix = 1
+                while self._lookup_version(kind, name, version) is not None:
+                    suffix += 1
+                    version = f"{base_version}-{suffix}"
+            
+            version_dir = os.path.join(self.registry_path, kind, name, version)
+            os.makedirs(os.path.dirname(version_dir), exist_ok=True)
+            
+            # Re-registering an existing version replaces it
+            old_dir = None
+            if os.path.exists(version_dir):
+                old_dir = os.path.join(self.tmp_path, f"old-{uuid.uuid4().hex}")
+                os.rename(version_dir, old_dir)
+            os.rename(staging_dir, version_dir)
+            
+            if files is not None:
+                self._write_manifest(kind, name, version, files)
+            
+            metadata["registry_path"] = version_dir
+            self._record_version(kind, name, version, metadata)
+            
+            # Forget any checkout (and its verified files) of a replaced version
+            self._checkouts.pop((kind, name, version), None)
+        
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+        
+        return version
+    
+    def _scan_path(self, source_path: str) -> List[tuple]:
+        """
+        List the files under a path in a single walk.
+        
+        Args:
+            source_path (str): Path to a directory or a single file
+            
+        Returns:
+            list: (relative path, full path, os.stat_result) tuples sorted by path
+        """
+        if not os.path.isdir(source_path):
+            return [(os.path.basename(source_path), source_path, os.stat(source_path))]
+        
+        sources = []
+        for dirpath, _, filenames in os.walk(source_path):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(full_path, source_path).replace(os.sep, "/")
+                sources.append((rel_path, full_path, os.stat(full_path)))
+        
+        return sorted(sources)
+    
+    def _previous_files(self, kind: str, name: str) -> Optional[Dict[str, Dict]]:
+        """Return the latest version's manifest entries by path, if any."""
+        latest = self._lookup_version(kind, name)
+        if latest is None:
+            return None
+        manifest = self._read_manifest(kind, name, latest["version"])
+        if manifest is None:
+            return None
+        return {entry["path"]: entry for entry in manifest["files"]}
+    
+    def _ingest_files(self, sources: List[tuple], previous: Dict[str, Dict] = None,
+                      chunk_size: int = None) -> tuple:
+        """
+        Hash files and add new contents to the object store.
+        
+        Files whose size and mtime match the previous manifest are carried
+        over by reference without being read. Other hashes come from the
+        hash cache when a file is unchanged; the rest are hashed and stored
+        in parallel on a thread pool.
+        
+        Args:
+            sources (list): Tuples from _scan_path
+            previous (dict, optional): Previous manifest entries by path
+            chunk_size (int, optional): Store files as chunks of this size
+                instead of whole-file blobs
+            
+        Returns:
+            tuple: (manifest file entries sorted by path, bytes newly stored)
+        """
+        carried = {}
+        for rel_path, full_path, stat in sources:
+            entry = (previous or {}).get(rel_path)
+            if (entry is not None and entry["size"] == stat.st_size
+                    and entry["mtime"] == stat.st_mtime
+                    and entry.get("chunk_size") == chunk_size
+                    and all(os.path.exists(self._blob_path(digest))
+                            for digest, _ in self._entry_blobs(entry))):
+                carried[full_path] = entry
+        
+        # Chunked files are always streamed, since the chunk list is needed
+        pending = [source for source in sources if source[1] not in carried]
+        digests = {} if chunk_size else self._cached_hashes(pending)
+        
+        def ingest(source):
+            rel_path, full_path, stat = source
+            if full_path in carried:
+                return dict(carried[full_path]), 0
+            
+            entry = {"path": rel_path}
+            if chunk_size:
+                entry["hash"], chunks, stored = self._store_chunks(full_path, chunk_size)
+            else:
+                entry["hash"] = digests.get(full_path) or self._calculate_file_hash(full_path)
+                stored = self._store_blob(full_path, entry["hash"])
+            entry["size"] = stat.st_size
+            entry["mtime"] = stat.st_mtime
+            if chunk_size:
+                entry["chunk_size"] = chunk_size
+                entry["chunks"] = chunks
+            return entry, stored
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.hash_workers) as pool:
+            results = list(pool.map(ingest, sources))
+        
+        self._update_hash_cache(
+            [(source, entry["hash"]) for source, (entry, _) in zip(sources, results)
+             if source[1] not in digests and source[1] not in carried])
+        
+        files = [entry for entry, _ in results]
+        return files, sum(stored for _, stored in results)
+    
+    def _cached_hashes(self, sources: List[tuple]) -> Dict[str, str]:
+        """
+        Look up hashes of unchanged files in the hash cache.
+        
+        A cache entry is valid only if the file's size, mtime and inode
+        all still match.
+        
+        Args:
+            sources (list): Tuples from _scan_path
+            
+        Returns:
+            dict: Full path -> cached SHA-256 hash
+        """
+        digests = {}
+        for _, full_path, stat in sources:
+            row = self.db.execute(
+                "SELECT hash FROM hash_cache WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+                (os.path.abspath(full_path), stat.st_size, stat.st_mtime_ns, stat.st_ino)).fetchone()
+            if row is not None:
+                digests[full_path] = row["hash"]
+        return digests
+    
+    def _update_hash_cache(self, entries: List[tuple]):
+        """Record freshly computed hashes as ((rel, full, stat), hash) pairs."""
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO hash_cache (path, size, mtime_ns, inode, hash) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(os.path.abspath(full_path), stat.st_size, stat.st_mtime_ns, stat.st_ino, digest)
+                 for (_, full_path, stat), digest in entries])
+    
+    def hash_path(self, path: str) -> str:
+        """
+        Hash a file or directory using the parallel, cached hashing engine.
+        
+        Args:
+            path (str): Path to a file or directory
+            
+        Returns:
+            str: SHA-256 of a file, or the Merkle digest of a directory
+        """
+        sources = self._scan_path(path)
+        digests = self._cached_hashes(sources)
+        missing = [source for source in sources if source[1] not in digests]
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.hash_workers) as pool:
+            computed = list(pool.map(lambda source: self._calculate_file_hash(source[1]), missing))
+        
+        self._update_hash_cache(list(zip(missing, computed)))
+        digests.update((source[1], digest) for source, digest in zip(missing, computed))
+        
+        if not os.path.isdir(path):
+            return digests[path]
+        return self._directory_digest(
+            [{"path": rel_path, "hash": digests[full_path]} for rel_path, full_path, _ in sources])
+    
+    def _directory_digest(self, files: List[Dict]) -> str:
+        """
+        Compute a Merkle-style digest of a directory tree.
+        
+        Each directory hashes the sorted list of its children's names and
+        hashes, so two trees share a digest only if every file matches.
+        
+        Args:
+            files (list): Entries with "path" and "hash" keys
+            
+        Returns:
+            str: Hexadecimal digest of the root directory
+        """
+        tree = {}
+        for entry in files:
+            node = tree
+            parts = entry["path"].split("/")
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+            node[parts[-1]] = entry["hash"]
+        
+        def digest(node):
+            sha256_hash = hashlib.sha256()
+            for name in sorted(node):
+                child = node[name]
+                if isinstance(child, dict):
+                    sha256_hash.update(f"tree {name} {digest(child)}\n".encode())
+                else:
+                    sha256_hash.update(f"blob {name} {child}\n".encode())
+            return sha256_hash.hexdigest()
+        
+        return digest(tree)
+    
+    def _blob_path(self, digest: str) -> str:
+        """Return the object store path for a content hash."""
+        return os.path.join(self.objects_path, digest[:2], digest[2:])
+    
+    def _store_blob(self, file_path: str, digest: str) -> int:
+        """
+        Copy a file into the object store unless its contents are already there.
+        
+        The copy is hashed as it is written and rejected if it does not
+        match digest (e.g. the file changed after it was hashed), so a blob
+        is never stored under the wrong name.
+        
+        Args:
+            file_path (str): Path to the source file
+            digest (str): SHA-256 hash of the file
+            
+        Returns:
+            int: Number of bytes written (0 if the blob already existed)
+            
+        Raises:
+            IOError: If the copied bytes do not match digest
+        """
+        blob_path = self._blob_path(digest)
+        if os.path.exists(blob_path):
+            return 0
+        
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        
+        # Write to a temporary name first so a partial blob is never visible
+        tmp_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+        size = self._copy_verified(file_path, tmp_path, digest)
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, blob_path)
+        
+        return size
+    
+    def _copy_verified(self, source: str, destination: str, digest: str) -> int:
+        """
+        Copy a file while hashing it, removing the copy if it does not match digest.
+        
+        Returns:
+            int: Number of bytes copied
+            
+        Raises:
+            IOError: If the copied bytes do not hash to digest
+        """
+        sha256_hash = hashlib.sha256()
+        size = 0
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            for data in iter(lambda: src.read(HASH_BUFFER_SIZE), b""):
+                sha256_hash.update(data)
+                dst.write(data)
+                size += len(data)
+        
+        if sha256_hash.hexdigest() != digest:
+            os.remove(destination)
+            raise IOError(f"Integrity check failed copying {source}: "
+                          f"contents changed or do not match {digest}")
+        shutil.copystat(source, destination)
+        return size
+    
+    def _store_chunks(self, file_path: str, chunk_size: int) -> tuple:
+        """
+        Stream a file into fixed-size chunk blobs with bounded memory.
+        
+        Only one chunk is held in memory at a time. Chunks already in the
+        object store (e.g. the unchanged prefix of an appended file) are
+        not written again.
+        
+        Args:
+            file_path (str): Path to the source file
+            chunk_size (int): Chunk size in bytes
+            
+        Returns:
+            tuple: (SHA-256 of the whole file, list of chunk hashes, bytes newly stored)
+        """
+        file_hash = hashlib.sha256()
+        chunks = []
+        new_bytes = 0
+        
+        with open(file_path, "rb") as f:
+            for data in iter(lambda: f.read(chunk_size), b""):
+                file_hash.update(data)
+                digest = hashlib.sha256(data).hexdigest()
+                chunks.append(digest)
+                
+                blob_path = self._blob_path(digest)
+                if os.path.exists(blob_path):
+                    continue
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                tmp_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+                with open(tmp_path, "wb") as out:
+                    out.write(data)
+                os.chmod(tmp_path, 0o444)
+                os.replace(tmp_path, blob_path)
+                new_bytes += len(data)
+        
+        return file_hash.hexdigest(), chunks, new_bytes
+    
+    def _assemble(self, entry: Dict) -> str:
+        """
+        Reassemble a chunked file into cache/ (once) and return its path.
+        
+        Chunks are streamed one at a time and the result is checked
+        against the whole-file hash before it becomes visible.
+        
+        Args:
+            entry (dict): Manifest entry with "chunks"
+            
+        Returns:
+            str: Absolute path of the read-only reassembled file
+        """
+        cached_path = os.path.abspath(os.path.join(self.cache_path, entry["hash"]))
+        if os.path.exists(cached_path):
+            return cached_path
+        
+        # Hold the GC lock (shared) so the chunks and tmp/ file stay put
+        with self._file_lock("gc", shared=True):
+            file_hash = hashlib.sha256()
+            tmp_path = os.path.join(self.tmp_path, f"assemble-{uuid.uuid4().hex}")
+            with open(tmp_path, "wb") as out:
+                for digest, _ in self._entry_blobs(entry):
+                    with open(self._blob_path(digest), "rb") as f:
+                        for data in iter(lambda: f.read(HASH_BUFFER_SIZE), b""):
+                            file_hash.update(data)
+                            out.write(data)
+            
+            if file_hash.hexdigest() != entry["hash"]:
+                os.remove(tmp_path)
+                raise IOError(f"Integrity check failed reassembling {entry['path']}")
+            
+            os.chmod(tmp_path, 0o444)
+            os.replace(tmp_path, cached_path)
+        
+        return cached_path
+    
+    def _manifest_path(self, kind: str, name: str, version: str) -> str:
+        """Return the manifest path for a model or dataset version."""
+        return os.path.join(self.manifests_path, kind, name, f"{version}.json")
+    
+    def _write_manifest(self, kind: str, name: str, version: str, files: List[Dict]):
+        """Write the manifest listing the blobs of a version."""
+        manifest_path = self._manifest_path(kind, name, version)
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        
+        manifest = {
+            "kind": kind,
+            "name": name,
+            "version": version,
+            "created": datetime.datetime.now().isoformat(),
+            "files": files
+        }
+        
+        # Write-then-rename so readers only ever see a complete manifest
+        tmp_path = f"{manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+    
+    def _read_manifest(self, kind: str, name: str, version: str) -> Optional[Dict]:
+        """Load the manifest of a version, or None if it has none."""
+        manifest_path = self._manifest_path(kind, name, version)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    
+    def _materialize(self, files: List[Dict], target_dir: str):
+        """
+        Create a version directory whose files point at the stored blobs.
+        
+        Args:
+            files (list): Manifest file entries
+            target_dir (str): Directory to populate
+        """
+        os.makedirs(target_dir, exist_ok=True)
+        
+        for entry in files:
+            # Chunked files are reassembled on demand by checkouts
+            if "chunks" in entry:
+                continue
+            destination = os.path.join(target_dir, *entry["path"].split("/"))
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            if os.path.lexists(destination):
+                os.remove(destination)
+            self._link_blob(entry["hash"], destination)
+    
+    def _link_blob(self, digest: str, destination: str):
+        """
+        Place a blob at destination without copying its data if possible.
+        
+        Tries a hardlink first, then a copy-on-write clone (reflink),
+        and falls back to a regular copy that is checked against digest.
+        """
+        blob_path = self._blob_path(digest)
+        try:
+            os.link(blob_path, destination)
+            return
+        except OSError:
+            pass
+        
+        if sys.platform.startswith("linux"):
+            try:
+                with open(blob_path, "rb") as src, open(destination, "wb") as dst:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return
+            except OSError:
+                if os.path.exists(destination):
+                    os.remove(destination)
+        
+        self._copy_verified(blob_path, destination, digest)
+    
     def _generate_version(self) -> str:
         """
         Generate a version string based on date and time.
@@ -323,12 +1396,42 @@ class ModelRegistry:
         sha256_hash = hashlib.sha256()
         
         with open(file_path, "rb") as f:
-            # Read the file in chunks to handle large files
-            for chunk in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(chunk)
+            size = os.fstat(f.fileno()).st_size
+            if size >= MMAP_THRESHOLD:
+                # Memory-map large files and hash them in big slices
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    view = memoryview(mm)
+                    try:
+                        for offset in range(0, size, HASH_BUFFER_SIZE):
+                            sha256_hash.update(view[offset:offset + HASH_BUFFER_SIZE])
+                    finally:
+                        view.release()
+            else:
+                # Read the file in large chunks
+                for chunk in iter(lambda: f.read(HASH_BUFFER_SIZE), b""):
+                    sha256_hash.update(chunk)
         
         return sha256_hash.hexdigest()
 
+def parse_filter(expression: str) -> tuple:
+    """
+    Parse a CLI filter such as "accuracy>0.9" into (key, operator, value).
+    
+    Values are read as JSON when possible (numbers, true/false, quoted
+    strings) and as plain strings otherwise.
+    """
+    match = re.match(r"^\s*([\w.]+)\s*(>=|<=|!=|=|>|<|~)\s*(.*?)\s*$", expression)
+    if not match:
+        raise ValueError(f"Invalid filter: {expression}")
+    
+    key, operator, value = match.groups()
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    
+    return key, operator, value
+
 def main():
     """Main function for the model registry utility."""
     parser = argparse.ArgumentParser(description="Model and dataset versioning utility")
@@ -340,6 +1443,8 @@ def main():
     register_model_parser.add_argument("--path", required=True, help="Path to model directory or file")
     register_model_parser.add_argument("--version", help="Version string (optional)")
     register_model_parser.add_argument("--metadata", help="JSON metadata string (optional)")
+    register_model_parser.add_argument("--incremental", action="store_true",
+                                       help="Only copy files changed since the latest version")
     
     # Register dataset command
     register_dataset_parser = subparsers.add_parser("register-dataset", help="Register a dataset")
@@ -347,6 +1452,10 @@ def main():
     register_dataset_parser.add_argument("--path", required=True, help="Path to dataset directory or file")
     register_dataset_parser.add_argument("--version", help="Version string (optional)")
     register_dataset_parser.add_argument("--metadata", help="JSON metadata string (optional)")
+    register_dataset_parser.add_argument("--incremental", action="store_true",
+                                         help="Only read files changed since the latest version")
+    register_dataset_parser.add_argument("--chunked", action="store_true", default=None,
+                                         help="Store as deduplicated chunks (default: datasets over 1GB)")
     
     # List models command
     subparsers.add_parser("list-models", help="List all registered models")
@@ -364,6 +1473,61 @@ def main():
     get_dataset_parser.add_argument("--name", required=True, help="Dataset name")
     get_dataset_parser.add_argument("--version", default="latest", help="Dataset version (default: latest)")
     
+    # Hash command
+    hash_parser = subparsers.add_parser("hash", help="Hash a file or directory (Merkle digest)")
+    hash_parser.add_argument("--path", required=True, help="Path to file or directory")
+    
+    # Tag command
+    tag_parser = subparsers.add_parser("tag", help="Tag a model or dataset version")
+    tag_parser.add_argument("--kind", choices=["model", "dataset"], default="model", help="Entry kind")
+    tag_parser.add_argument("--name", required=True, help="Model or dataset name")
+    tag_parser.add_argument("--version", required=True, help="Version to tag")
+    tag_parser.add_argument("--tag", required=True, help="Tag name")
+    
+    # Delete command
+    delete_parser = subparsers.add_parser("delete", help="Delete a model or dataset version")
+    delete_parser.add_argument("--kind", choices=["model", "dataset"], default="model", help="Entry kind")
+    delete_parser.add_argument("--name", required=True, help="Model or dataset name")
+    delete_parser.add_argument("--version", required=True, help="Version to delete")
+    
+    # Prune command
+    prune_parser = subparsers.add_parser("prune", help="Delete versions outside a retention policy")
+    prune_parser.add_argument("--kind", choices=["model", "dataset"], default="model", help="Entry kind")
+    prune_parser.add_argument("--name", help="Only prune this model or dataset")
+    prune_parser.add_argument("--keep-last", type=int, help="Keep the newest N versions")
+    prune_parser.add_argument("--newer-than", type=float, help="Keep versions younger than N days")
+    prune_parser.add_argument("--no-keep-tagged", action="store_true", help="Also prune tagged versions")
+    prune_parser.add_argument("--dry-run", action="store_true", help="Only show what would be deleted")
+    
+    # Garbage collection command
+    gc_parser = subparsers.add_parser("gc", help="Remove blobs no version references")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Only show what would be freed")
+    
+    # Space report command
+    subparsers.add_parser("du", help="Show disk usage per model and dataset")
+    
+    # Query command
+    query_parser = subparsers.add_parser("query", help="Search versions by metadata")
+    query_parser.add_argument("--kind", choices=["model", "dataset"], default="model", help="Entry kind")
+    query_parser.add_argument("--name", help="Only versions of this model or dataset")
+    query_parser.add_argument("--where", action="append", default=[],
+                              help="Filter such as 'accuracy>0.9' or 'dataset=X' (repeatable)")
+    query_parser.add_argument("--sort", help="Metadata key to sort by")
+    query_parser.add_argument("--desc", action="store_true", help="Sort in descending order")
+    query_parser.add_argument("--limit", type=int, help="Maximum number of results")
+    query_parser.add_argument("--offset", type=int, default=0, help="Number of results to skip")
+    
+    # Index command
+    index_parser = subparsers.add_parser("index", help="Add a secondary index on a metadata key")
+    index_parser.add_argument("--key", help="Metadata key to index (lists indexes if omitted)")
+    
+    # Checkout command
+    checkout_parser = subparsers.add_parser("checkout", help="Print the read-only path of a version")
+    checkout_parser.add_argument("--kind", choices=["model", "dataset"], default="model", help="Entry kind")
+    checkout_parser.add_argument("--name", required=True, help="Model or dataset name")
+    checkout_parser.add_argument("--version", default="latest", help="Version or tag (default: latest)")
+    checkout_parser.add_argument("--verify", action="store_true", help="Verify all files before printing")
+    
     # Parse arguments
     args = parser.parse_args()
     
@@ -373,11 +1537,12 @@ def main():
     # Execute command
     if args.command == "register-model":
         metadata = json.loads(args.metadata) if args.metadata else None
-        registry.register_model(args.name, args.path, args.version, metadata)
+        registry.register_model(args.name, args.path, args.version, metadata, args.incremental)
     
     elif args.command == "register-dataset":
         metadata = json.loads(args.metadata) if args.metadata else None
-        registry.register_dataset(args.name, args.path, args.version, metadata)
+        registry.register_dataset(args.name, args.path, args.version, metadata,
+                                  args.incremental, args.chunked)
     
     elif args.command == "list-models":
         models = registry.list_models()
@@ -397,6 +1562,53 @@ def main():
         if dataset_info:
             print(json.dumps(dataset_info, indent=2))
     
+    elif args.command == "hash":
+        print(registry.hash_path(args.path))
+    
+    elif args.command == "query":
+        filters = [parse_filter(expression) for expression in args.where]
+        results = registry.query(args.kind + "s", filters, args.name, args.sort,
+                                 args.desc, args.limit, args.offset)
+        print(json.dumps(results, indent=2))
+    
+    elif args.command == "index":
+        if args.key:
+            registry.create_index(args.key)
+            print(f"Indexed metadata key: {args.key}")
+        else:
+            print("\n".join(registry.list_indexes()))
+    
+    elif args.command == "checkout":
+        checkout = registry.checkout(args.name, args.version, args.kind + "s")
+        if args.verify:
+            checkout.verify_all()
+        print(checkout.path)
+    
+    elif args.command == "tag":
+        registry.tag_version(args.kind + "s", args.name, args.version, args.tag)
+        print(f"Tagged {args.name} {args.version} as {args.tag}")
+    
+    elif args.command == "delete":
+        registry.delete_version(args.kind + "s", args.name, args.version)
+        print(f"Deleted {args.name} {args.version}")
+    
+    elif args.command == "prune":
+        deleted = registry.prune(args.kind + "s", args.name, args.keep_last,
+                                 not args.no_keep_tagged, args.newer_than, args.dry_run)
+        action = "Would delete" if args.dry_run else "Deleted"
+        for name, version in deleted:
+            print(f"{action} {name} {version}")
+        print(f"{action} {len(deleted)} version(s). Run 'gc' to free their blobs.")
+    
+    elif args.command == "gc":
+        result = registry.gc(args.dry_run)
+        action = "Would free" if args.dry_run else "Freed"
+        print(f"{action} {result['bytes_freed'] / (1024**2):.2f} MB "
+              f"({result['blobs_removed']} blobs, {result['blobs_kept']} kept)")
+    
+    elif args.command == "du":
+        print(json.dumps(registry.space_report(), indent=2))
+    
     else:
         parser.print_help()
 
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+
+"""
+HTTP server and client for sharing a model registry between machines.
+"""
+
+import os
+import re
+import json
+import hashlib
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import concurrent.futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from model_registry import ModelRegistry
+
+BLOB_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+MANIFEST_PATTERN = re.compile(r"^/v1/(models|datasets)/([^/]+)/([^/]+)/manifest$")
+
+# Bytes sent or received per read/write when streaming blobs
+TRANSFER_BUFFER_SIZE = 1024 * 1024
+
+class RegistryRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serve manifests and blobs of a ModelRegistry over HTTP.
+    
+    GET /v1/<models|datasets>/<name>/<version>/manifest returns the
+    manifest and metadata as JSON (version may be "latest" or a tag).
+    GET or HEAD /v1/blobs/<hash> returns a blob, with its hash as ETag
+    and support for single Range requests.
+    """
+    registry = None
+    registry_lock = threading.Lock()
+    
+    def do_GET(self):
+        """Handle GET requests."""
+        self._handle(send_body=True)
+    
+    def do_HEAD(self):
+        """Handle HEAD requests."""
+        self._handle(send_body=False)
+    
+    def _handle(self, send_body: bool):
+        """Route a request to the manifest or blob handler."""
+        path = self.path.split("?", 1)[0]
+        
+        match = MANIFEST_PATTERN.match(path)
+        if match:
+            kind, name, version = (urllib.parse.unquote(part) for part in match.groups())
+            self._send_manifest(kind, name, version, send_body)
+            return
+        
+        if path.startswith("/v1/blobs/"):
+            self._send_blob(path[len("/v1/blobs/"):], send_body)
+            return
+        
+        self.send_error(404, "Not found")
+    
+    def _send_manifest(self, kind: str, name: str, version: str, send_body: bool):
+        """Send the manifest and metadata of a version as JSON."""
+        with self.registry_lock:
+            info = self.registry._lookup_version(kind, name, version)
+            manifest = self.registry._read_manifest(kind, name, info["version"]) if info else None
+        if manifest is None:
+            self.send_error(404, f"{name} {version} not found")
+            return
+        
+        body = json.dumps({"manifest": manifest, "metadata": info}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+    
+    def _send_blob(self, digest: str, send_body: bool):
+        """Send a blob, honouring If-None-Match, Range and If-Range."""
+        if not BLOB_PATTERN.match(digest):
+            self.send_error(400, "Invalid blob hash")
+            return
+        
+        blob_path = self.registry._blob_path(digest)
+        if not os.path.exists(blob_path):
+            self.send_error(404, "Blob not found")
+            return
+        
+        # Blobs are content-addressed, so the hash is a perfect ETag
+        etag = f'"{digest}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        
+        size = os.path.getsize(blob_path)
+        start, end = 0, size - 1
+        partial = False
+        
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and (if_range is None or if_range == etag):
+            match = RANGE_PATTERN.match(range_header.strip())
+            if match and match.group(1):
+                start = int(match.group(1))
+                if match.group(2):
+                    end = min(int(match.group(2)), size - 1)
+            elif match and match.group(2):
+                start = max(size - int(match.group(2)), 0)
+            if not match or start > end or start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            partial = True
+        
+        self.send_response(206 if partial else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        
+        if not send_body:
+            return
+        
+        with open(blob_path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(TRANSFER_BUFFER_SIZE, remaining))
+                if not data:
+                    break
+                self.wfile.write(data)
+                remaining -= len(data)
+
+def create_server(registry_path: str = "model_registry", host: str = "127.0.0.1",
+                  port: int = 8700) -> ThreadingHTTPServer:
+    """
+    Create a threaded HTTP server for a registry (call serve_forever() to run it).
+    
+    Args:
+        registry_path (str): Path of the registry to serve
+        host (str): Interface to bind
+        port (int): Port to bind (0 picks a free port)
+    
+    Returns:
+        ThreadingHTTPServer: The server
+    """
+    handler = type("BoundRegistryRequestHandler", (RegistryRequestHandler,),
+                   {"registry": ModelRegistry(registry_path), "registry_lock": threading.Lock()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+class RegistryClient:
+    """
+    Pull versions from a registry server into a local registry.
+    
+    The local registry doubles as the blob cache: only blobs it does not
+    already have are downloaded, in parallel, and interrupted downloads
+    resume from their .part file with a Range request.
+    """
+    
+    def __init__(self, base_url: str, cache_path: str = "registry_cache", workers: int = 8):
+        """Initialize the client."""
+        self.base_url = base_url.rstrip("/")
+        self.local = ModelRegistry(cache_path)
+        self.cache_path = cache_path
+        self.workers = workers
+    
+    def pull(self, name: str, version: str = "latest", kind: str = "models") -> Optional[Dict]:
+        """
+        Download a version and register it in the local registry.
+        
+        Args:
+            name (str): Model or dataset name
+            version (str): Version, tag, or "latest"
+            kind (str): "models" or "datasets"
+        
+        Returns:
+            dict or None: Local version information, or None if not found
+        """
+        url = (f"{self.base_url}/v1/{kind}/{urllib.parse.quote(name, safe='')}/"
+               f"{urllib.parse.quote(version, safe='')}/manifest")
+        try:
+            with urllib.request.urlopen(url) as response:
+                remote = json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                print(f"{name} {version} not found on {self.base_url}")
+                return None
+            raise
+        
+        manifest = remote["manifest"]
+        metadata = remote["metadata"]
+        version = metadata.pop("version")
+        metadata.pop("name")
+        
+        # Hold the local GC lock (shared) while blobs are arriving
+        with self.local._file_lock("gc", shared=True):
+            blobs = {}
+            for digest, size in self.local._manifest_blobs(manifest):
+                if not os.path.exists(self.local._blob_path(digest)):
+                    blobs[digest] = size
+            
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as pool:
+                downloaded = sum(pool.map(self._fetch_blob, blobs))
+            
+            staging_dir = self.local._new_staging_dir()
+            self.local._materialize(manifest["files"], staging_dir)
+            metadata["pulled_from"] = self.base_url
+            self.local._commit_version(kind, name, version, staging_dir, manifest["files"], metadata)
+        
+        print(f"Pulled {name} {version}: {len(blobs)} blob(s) fetched, "
+              f"{downloaded / (1024**2):.2f} MB downloaded")
+        return self.local._lookup_version(kind, name, version)
+    
+    def _fetch_blob(self, digest: str) -> int:
+        """
+        Download one blob into the local object store, resuming if possible.
+        
+        Args:
+            digest (str): Blob hash
+        
+        Returns:
+            int: Bytes downloaded
+        """
+        blob_path = self.local._blob_path(digest)
+        part_path = blob_path + ".part"
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        
+        request = urllib.request.Request(f"{self.base_url}/v1/blobs/{digest}")
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+            request.add_header("If-Range", f'"{digest}"')
+        
+        downloaded = 0
+        try:
+            with urllib.request.urlopen(request) as response:
+                # A 200 means the server ignored the range: start over
+                mode = "ab" if response.status == 206 else "wb"
+                with open(part_path, mode) as f:
+                    for data in iter(lambda: response.read(TRANSFER_BUFFER_SIZE), b""):
+                        f.write(data)
+                        downloaded += len(data)
+        except urllib.error.HTTPError as e:
+            # 416: the .part file is already complete (or bogus); verify below
+            if e.code != 416:
+                raise
+        
+        # Verify before the blob becomes visible
+        sha256_hash = hashlib.sha256()
+        with open(part_path, "rb") as f:
+            for data in iter(lambda: f.read(TRANSFER_BUFFER_SIZE), b""):
+                sha256_hash.update(data)
+        if sha256_hash.hexdigest() != digest:
+            os.remove(part_path)
+            raise IOError(f"Downloaded blob {digest} failed verification")
+        
+        os.chmod(part_path, 0o444)
+        os.replace(part_path, blob_path)
+        return downloaded
+
+def main():
+    """Main function for the registry server utility."""
+    parser = argparse.ArgumentParser(description="Serve or pull models from a model registry over HTTP")
+    subparsers = parser.add_subparsers(dest="command", help="Command to execute")
+    
+    # Serve command
+    serve_parser = subparsers.add_parser("serve", help="Serve a registry over HTTP")
+    serve_parser.add_argument("--registry", default="model_registry", help="Registry path")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    serve_parser.add_argument("--port", type=int, default=8700, help="Port to bind")
+    
+    # Pull command
+    pull_parser = subparsers.add_parser("pull", help="Pull a version from a registry server")
+    pull_parser.add_argument("--url", required=True, help="Registry server URL")
+    pull_parser.add_argument("--name", required=True, help="Model or dataset name")
+    pull_parser.add_argument("--version", default="latest", help="Version or tag (default: latest)")
+    pull_parser.add_argument("--kind", choices=["model", "dataset"], default="model", help="Entry kind")
+    pull_parser.add_argument("--cache", default="registry_cache", help="Local registry/cache path")
+    pull_parser.add_argument("--workers", type=int, default=8, help="Parallel downloads")
+    
+    # Parse arguments
+    args = parser.parse_args()
+    
+    # Execute command
+    if args.command == "serve":
+        server = create_server(args.registry, args.host, args.port)
+        print(f"Serving {args.registry} on http://{args.host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    
+    elif args.command == "pull":
+        client = RegistryClient(args.url, args.cache, args.workers)
+        info = client.pull(args.name, args.version, args.kind + "s")
+        if info:
+            print(info["registry_path"])
+    
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
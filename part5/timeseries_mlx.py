@@ -7,8 +7,8 @@ Time series forecasting with MLX.
 import os
 import argparse
 import csv
+import multiprocessing
 import numpy as np
-import matplotlib.pyplot as plt
 import mlx.core as mx
 import mlx.nn as nn
 import mlx.optimizers as optim
@@ -113,6 +113,65 @@ def train_model(model, X, y, epochs=100, batch_size=32, learning_rate=0.01):
     
     return losses
 
+def save_predictions(predictions, output_file):
+    """
+    Save predictions to a CSV or NPY file.
+    
+    Args:
+        predictions (list): Predicted values
+        output_file (str): Output path (.csv or .npy)
+    """
+    if output_file.endswith(".npy"):
+        np.save(output_file, np.array(predictions, dtype=np.float32))
+    elif output_file.endswith(".csv"):
+        with open(output_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Day", "Prediction"])
+            for i, pred in enumerate(predictions):
+                writer.writerow([i + 1, f"{pred:.6f}"])
+    else:
+        raise ValueError(f"Unsupported output format: {output_file} (use .csv or .npy)")
+
+def plot_forecast(prices, predictions, column, output_file):
+    """
+    Plot historical data and forecast to a PNG file.
+    
+    matplotlib is imported here, with the headless Agg backend, so runs
+    that only need the numbers never pay its import cost.
+    
+    Args:
+        prices (list): Historical prices
+        predictions (list): Predicted prices
+        column (str): Name of the price column
+        output_file (str): Path of the PNG to write
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    
+    plt.figure(figsize=(12, 6))
+    
+    # Plot historical data
+    plt.plot(range(len(prices)), prices, label="Historical Data")
+    
+    # Plot predictions
+    forecast_range = range(len(prices) - 1, len(prices) + len(predictions) - 1)
+    plt.plot(forecast_range, predictions, label="Forecast", color="red")
+    
+    # Add vertical line at prediction start
+    plt.axvline(x=len(prices) - 1, color="gray", linestyle="--")
+    
+    plt.title(f"Stock Price Forecast ({column})")
+    plt.xlabel("Time")
+    plt.ylabel("Price")
+    plt.legend()
+    plt.tight_layout()
+    
+    # Save plot
+    plt.savefig(output_file)
+    plt.close()
+    print(f"Forecast saved to {output_file}")
+
 def main():
     """Main function."""
     parser = argparse.ArgumentParser(description="Time series forecasting with MLX")
@@ -126,8 +185,17 @@ def main():
                         help="Sequence length for time series")
     parser.add_argument("--predict", type=int, default=30,
                         help="Number of days to predict")
+    parser.add_argument("--output", type=str,
+                        help="Save predictions to a .csv or .npy file")
+    parser.add_argument("--no-plot", action="store_true",
+                        help="Skip plotting (matplotlib is never imported)")
+    parser.add_argument("--background-plot", action="store_true",
+                        help="Render the plot in a background process")
     args = parser.parse_args()
     
+    if args.output and not args.output.endswith((".csv", ".npy")):
+        parser.error("--output must end in .csv or .npy")
+    
     # Load and prepare data
     dates, prices = load_stock_data(args.csv, args.column)
     X, y, X_mean, X_std, y_mean, y_std = prepare_timeseries_data(prices, args.sequence)
@@ -158,34 +226,30 @@ def main():
                                  axis=1)
         current_sequence = new_seq
     
-    # Plot results
-    plt.figure(figsize=(12, 6))
-    
-    # Plot historical data
-    plt.plot(range(len(prices)), prices, label="Historical Data")
-    
-    # Plot predictions
-    forecast_range = range(len(prices) - 1, len(prices) + args.predict - 1)
-    plt.plot(forecast_range, predictions, label="Forecast", color="red")
-    
-    # Add vertical line at prediction start
-    plt.axvline(x=len(prices) - 1, color="gray", linestyle="--")
-    
-    plt.title(f"Stock Price Forecast ({args.column})")
-    plt.xlabel("Time")
-    plt.ylabel("Price")
-    plt.legend()
-    plt.tight_layout()
-    
-    # Save plot
-    output_file = f"stock_forecast_{os.path.basename(args.csv).split('.')[0]}.png"
-    plt.savefig(output_file)
-    print(f"Forecast saved to {output_file}")
+    # Save predictions (CSV/NPY) for headless batch jobs
+    if args.output:
+        save_predictions(predictions, args.output)
+        print(f"Predictions saved to {args.output}")
+    
+    # Plot results (optional output stage)
+    plot_process = None
+    if not args.no_plot:
+        output_file = f"stock_forecast_{os.path.basename(args.csv).split('.')[0]}.png"
+        plot_args = (prices, predictions, args.column, output_file)
+        if args.background_plot:
+            # Render in a separate process so the numbers are available immediately
+            plot_process = multiprocessing.Process(target=plot_forecast, args=plot_args)
+            plot_process.start()
+        else:
+            plot_forecast(*plot_args)
     
     # Print predictions
     print("\nPredictions for the next", args.predict, "days:")
     for i, pred in enumerate(predictions):
         print(f"Day {i+1}: {pred:.2f}")
+    
+    if plot_process is not None:
+        plot_process.join()
 
 if __name__ == "__main__":
     main()